@@ -1,4 +1,5 @@
 from helpers.StrategyCoreResolver import StrategyCoreResolver
+from helpers.reporting import get_reporter
 from rich.console import Console
 from brownie import interface
 from config import TOKEN1, TOKEN2
@@ -45,7 +46,7 @@ class StrategyResolver(StrategyCoreResolver):
         """
         Verfies that the Harvest produced yield and fees
         """
-        console.print("=== Compare Harvest ===")
+        get_reporter().print("=== Compare Harvest ===")
         self.manager.printCompare(before, after)
         self.confirm_harvest_state(before, after, tx)
 
@@ -118,10 +119,10 @@ class StrategyResolver(StrategyCoreResolver):
             for key in keys:
                 assert key in event
 
-            console.print("[blue]== harvest() Harvest State ==[/blue]")
+            get_reporter().print("[blue]== harvest() Harvest State ==[/blue]")
             self.printState(event, keys)
 
 
     def printState(self, event, keys):
         for key in keys:
-            print(key, ": ", event[key])
+            get_reporter().add("text", print, key, ": ", event[key])
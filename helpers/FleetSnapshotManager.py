@@ -0,0 +1,88 @@
+import copy
+
+from helpers.multicall import CallPlan, Multicall
+from helpers.reporting import get_reporter
+
+from helpers.SnapshotManager import SnapshotManager
+
+
+class FleetSnapshotManager:
+    """
+    Snaps many vaults at once
+    Every vault keeps its own SnapshotManager (and resolver), their snap
+    plans are merged into one plan with keys prefixed by the vault key, so a
+    block costs one chunked multicall for the whole fleet
+    """
+
+    def __init__(self, key="fleet"):
+        self.key = key
+        self.managers = {}
+        # Merged plans by every vault's entity set, see fleet_plan
+        self.plans = {}
+
+    def addVault(self, sett, strategy, controller, key, **options):
+        return self.addManager(
+            SnapshotManager(sett, strategy, controller, key, **options)
+        )
+
+    def addManager(self, manager: SnapshotManager):
+        self.managers[manager.key] = manager
+        self.plans = {}
+        return manager
+
+    def namespaced(self, vaultKey, calls):
+        """
+        Copies of the calls returning "<vaultKey>.<key>", calldata included
+        """
+        prefixed = []
+        for call in calls:
+            call = copy.copy(call)
+            call.returns = [
+                [vaultKey + "." + name, handler] for name, handler in call.returns or []
+            ]
+            prefixed.append(call)
+        return prefixed
+
+    def fleet_plan(self, entities):
+        """
+        One plan for every vault, entities maps vault keys to entity sets
+        """
+        key = tuple((vaultKey, tuple(items.items())) for vaultKey, items in entities)
+        if key not in self.plans:
+            calls = []
+            for vaultKey, items in entities:
+                plan = self.managers[vaultKey].snap_plan(items)
+                calls += self.namespaced(vaultKey, plan.calls)
+            self.plans[key] = CallPlan(calls)
+        return self.plans[key]
+
+    def snap(self, trackedUsers=None, block=None):
+        """
+        Snaps every vault at the same block, returns {vault key: Snap}
+        trackedUsers are added to the entities of every vault
+        """
+        get_reporter().add("snap", print, "fleet snap")
+        entities = []
+        for vaultKey, manager in self.managers.items():
+            for key, user in (trackedUsers or {}).items():
+                manager.addEntity(key, user)
+            entities.append((vaultKey, manager.entities))
+
+        multi = Multicall(self.fleet_plan(entities), block_id=block, label=self.key)
+        data = multi()
+
+        snaps = {}
+        for vaultKey, items in entities:
+            manager = self.managers[vaultKey]
+            prefix = vaultKey + "."
+            vaultData = {
+                name: data[prefix + name] for name in manager.snap_plan(items).keys
+            }
+            snaps[vaultKey] = manager.storeSnap(vaultData, multi.block, items)
+        return snaps
+
+    def __getitem__(self, vaultKey):
+        return self.managers[vaultKey]
+
+    def __len__(self):
+        return len(self.managers)
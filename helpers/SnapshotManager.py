@@ -1,27 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from brownie import *
 from tabulate import tabulate
 from rich.console import Console
-from helpers.multicall import Multicall
+from helpers.multicall import CallPlan, Multicall
+from helpers.multicall.aggregator import resolve_aggregator
+from helpers.reporting import get_reporter
 from helpers.utils import val
 
+from helpers.snapshot.diff import SnapDiff, delta, diff_snaps
+from helpers.snapshot.history import SnapHistory
+from helpers.snapshot.lazy import LazySnap
+from helpers.snapshot.schema import get_schema
 from helpers.snapshot.snap import Snap
+from helpers.snapshot.transfers import TransferPlan
 
 from config.StrategyResolver import StrategyResolver
 
 console = Console()
 
+# Keys holding amounts of the sett's want token
+WANT_DENOMINATED = {
+    "sett.balance",
+    "sett.available",
+    "strategy.balanceOfPool",
+    "strategy.balanceOfWant",
+    "strategy.balanceOf",
+}
+
 
 class SnapshotManager:
-    def __init__(self, sett, strategy, controller, key):
+    def __init__(
+        self,
+        sett,
+        strategy,
+        controller,
+        key,
+        receiptSnaps=False,
+        transferSnaps=False,
+        verifyTransferSnaps=False,
+        lazySnaps=False,
+        archive=None,
+    ):
         self.key = key
+        # Read before / after states at the receipt's block once the tx is
+        # mined, instead of snapping on either side of it, see snapTx.
+        # Off by default, it needs the tx alone in its block
+        self.receiptSnaps = receiptSnaps
+        # Derive the after balances from the receipt's Transfer logs and only
+        # read the other getters again. Tokens that move balances without a
+        # Transfer (rebases, fees) need verifyTransferSnaps to catch them
+        self.transferSnaps = transferSnaps
+        self.verifyTransferSnaps = verifyTransferSnaps
+        # Only fetch the keys the resolver read in earlier snaps, see LazySnap.
+        # The first snap fetches everything to learn them
+        self.lazySnaps = lazySnaps
+        self.usedKeys = set()
         self.sett = sett
         self.strategy = strategy
         self.controller = controller
         self.want = interface.IERC20(self.sett.token())
         self.resolver = self.init_resolver(self.strategy.getName())
-        self.snaps = {}
+        # Every snap by sequence id, older ones spilled to disk
+        self.snaps = SnapHistory()
+        # SnapArchive every snap is also appended to, for later analysis
+        self.archive = archive
         self.settSnaps = {}
         self.entities = {}
+        # Compiled snap call plans by entity set, see snap_plan
+        self.plans = {}
+        self.transferPlans = {}
+        self.keyCalls = {}
+        # token key -> decimals, from the decimals.* keys of the first snap
+        self.decimals = {}
 
         assert self.want == self.strategy.want()
 
@@ -45,162 +96,338 @@ class SnapshotManager:
         calls = self.resolver.add_strategy_snap(calls, entities=entities)
         return calls
 
-    def snap(self, trackedUsers=None):
-        print("snap")
-        snapBlock = chain.height
+    def snap_plan(self, entities, keys=None):
+        """
+        The resolver's snap calls compiled once per entity set, or only the
+        calls returning some of `keys` if given
+        Call resetPlans() if the resolver's calls depend on state that changed
+        """
+        key = (tuple(entities.items()), keys)
+        if key not in self.plans:
+            if keys is None:
+                calls = self.add_snap_calls(entities)
+            else:
+                calls = [
+                    call
+                    for call in self.snap_plan(entities).calls
+                    if any(name in keys for name, _ in call.returns or [])
+                ]
+            self.plans[key] = CallPlan(calls)
+        return self.plans[key]
+
+    def key_calls(self, entities):
+        """
+        Every snap key for the entity set, mapped to the call returning it
+        """
+        key = tuple(entities.items())
+        if key not in self.keyCalls:
+            self.keyCalls[key] = {
+                name: call
+                for call in self.snap_plan(entities).calls
+                for name, _ in call.returns or []
+            }
+        return self.keyCalls[key]
+
+    def resetPlans(self):
+        self.plans = {}
+        self.transferPlans = {}
+        self.keyCalls = {}
+
+    def snap(self, trackedUsers=None, block=None):
+        data, snapBlock = self.read(trackedUsers, block)
+        return self.storeSnap(data, snapBlock, self.entities)
+
+    def read(self, trackedUsers=None, block=None):
+        """
+        Reads the snap plan, returns (data, block) without storing a snap
+        """
+        get_reporter().add("snap", print, "snap")
         entities = self.entities
 
         if trackedUsers:
             for key, user in trackedUsers.items():
                 entities[key] = user
 
-        calls = self.add_snap_calls(entities)
-
-        multi = Multicall(calls)
+        if self.lazySnaps and self.usedKeys:
+            plan = self.snap_plan(entities, frozenset(self.usedKeys))
+        else:
+            plan = self.snap_plan(entities)
+        multi = Multicall(plan, block_id=block, label=self.key)
         # multi.printCalls()
 
         data = multi()
-        self.snaps[snapBlock] = Snap(
-            data,
-            snapBlock,
-            [x[0] for x in entities.items()],
-        )
-
-        return self.snaps[snapBlock]
+        # The aggregate reports the block it read at, no chain.height round trip
+        return data, multi.block
+
+    def storeSnap(self, data, block, entities):
+        """
+        Snap of data read for the entity set, kept in the history
+        """
+        snap = self.newSnap(data, block, entities)
+        self.addSnap(snap)
+        for key, decimals in snap.prefix("decimals").items():
+            if decimals is not None:
+                self.decimals[key.split(".", 1)[1]] = decimals
+        return snap
+
+    def addSnap(self, snap):
+        self.snaps.add(snap)
+        if self.archive:
+            self.archive.write(snap)
+
+    def newSnap(self, data, block, entities):
+        entityKeys = [x[0] for x in entities.items()]
+        # Every snap of the entity set shares the layout of the full plan
+        schema = get_schema(self.snap_plan(entities).keys)
+        if self.lazySnaps:
+            return LazySnap(
+                data,
+                block,
+                entityKeys,
+                self.key_calls(entities),
+                self.usedKeys,
+                self.key,
+                schema,
+            )
+        return Snap(data, block, entityKeys, schema)
+
+    def snapTx(self, trackedUsers, send):
+        """
+        Runs send() and returns (before, after, tx)
+        With receiptSnaps the tx goes out first and the states at the blocks
+        either side of it are read concurrently. This relies on the tx being
+        alone in its block, as it is on automining development chains
+        The aggregator is resolved (on development chains deployed) before
+        the tx, so the block before it is not before the aggregator
+        """
+        if not self.receiptSnaps:
+            before = self.snap(trackedUsers)
+            tx = send()
+            if not self.transferSnaps:
+                after = self.snap(trackedUsers)
+                return before, after, tx
+            transfers = self.transfer_plan(self.entities)
+            rest = Multicall(transfers.rest, block_id=tx.block_number, label=self.key)
+            return before, self.transferSnap(before, rest(), tx), tx
+
+        resolve_aggregator(web3.chain_id)
+        tx = send()
+        block = tx.block_number
+        for key, user in trackedUsers.items():
+            self.addEntity(key, user)
+        # Compile the plan once, up front, for both snaps to share
+        self.snap_plan(self.entities)
+
+        # Read concurrently, stored here in block order
+        if not self.transferSnaps:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                reads = list(
+                    pool.map(
+                        lambda block: self.read(trackedUsers, block), [block - 1, block]
+                    )
+                )
+            before, after = [
+                self.storeSnap(data, snapBlock, self.entities)
+                for data, snapBlock in reads
+            ]
+            return before, after, tx
+
+        transfers = self.transfer_plan(self.entities)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            before = pool.submit(self.read, trackedUsers, block - 1)
+            rest = pool.submit(
+                Multicall(transfers.rest, block_id=block, label=self.key)
+            )
+            before, rest = before.result(), rest.result()
+        before = self.storeSnap(*before, self.entities)
+        return before, self.transferSnap(before, rest, tx), tx
+
+    def transferSnap(self, before, rest, tx):
+        """
+        The after snap: balances of before moved by the receipt's Transfer
+        logs, `rest` the other keys read at the receipt's block
+        """
+        block = tx.block_number
+        data = self.transfer_plan(self.entities).apply(before.data, tx.logs)
+        data.update(rest)
+        after = self.newSnap(data, block, self.entities)
+
+        if self.verifyTransferSnaps:
+            # Read, not snapped, the history and archive keep the derived one
+            plan = self.snap_plan(self.entities)
+            full = Multicall(plan, block_id=block, label=self.key)()
+            self.verifySnap(after, self.newSnap(full, block, self.entities))
+        self.addSnap(after)
+        return after
+
+    def transfer_plan(self, entities):
+        """
+        The snap plan split into Transfer derived balances and the rest
+        """
+        key = tuple(entities.items())
+        if key not in self.transferPlans:
+            self.transferPlans[key] = TransferPlan(self.snap_plan(entities))
+        return self.transferPlans[key]
+
+    def verifySnap(self, derived: Snap, full: Snap):
+        """
+        Compares the keys the derived snap holds, a LazySnap only holds the
+        used ones and reads the rest at its block when they are asked for
+        """
+        fullData = full.data
+        mismatched = [
+            key
+            for key, value in derived.data.items()
+            if key not in fullData or fullData[key] != value
+        ]
+        if mismatched:
+            raise Exception(
+                "Transfer derived snap at {} differs from a full snap on {}".format(
+                    full.block, mismatched
+                )
+            )
 
     def addEntity(self, key, entity):
         self.entities[key] = entity
 
     def init_resolver(self, name):
-        print("init_resolver", name)
+        get_reporter().add("text", print, "init_resolver", name)
         return StrategyResolver(self)
 
     def settTend(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
-        tx = self.strategy.tend(overrides)
-        after = self.snap(trackedUsers)
+        before, after, tx = self.snapTx(
+            trackedUsers, lambda: self.strategy.tend(overrides)
+        )
         if confirm:
-            self.resolver.confirm_tend(before, after, tx)
+            with get_reporter().step():
+                self.resolver.confirm_tend(before, after, tx)
 
     def settHarvest(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
-        tx = self.strategy.harvest(overrides)
-        after = self.snap(trackedUsers)
+        before, after, tx = self.snapTx(
+            trackedUsers, lambda: self.strategy.harvest(overrides)
+        )
         if confirm:
-            self.resolver.confirm_harvest(before, after, tx)
+            with get_reporter().step():
+                self.resolver.confirm_harvest(before, after, tx)
 
     def settDeposit(self, amount, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
-        self.sett.deposit(amount, overrides)
-        after = self.snap(trackedUsers)
+        before, after, tx = self.snapTx(
+            trackedUsers, lambda: self.sett.deposit(amount, overrides)
+        )
 
         if confirm:
-            self.resolver.confirm_deposit(
-                before, after, {"user": user, "amount": amount}
-            )
+            with get_reporter().step():
+                self.resolver.confirm_deposit(
+                    before, after, {"user": user, "amount": amount}
+                )
 
     def settDepositAll(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
         userBalance = self.want.balanceOf(user)
-        before = self.snap(trackedUsers)
-        self.sett.depositAll(overrides)
-        after = self.snap(trackedUsers)
+        before, after, tx = self.snapTx(
+            trackedUsers, lambda: self.sett.depositAll(overrides)
+        )
         if confirm:
-            self.resolver.confirm_deposit(
-                before, after, {"user": user, "amount": userBalance}
-            )
+            with get_reporter().step():
+                self.resolver.confirm_deposit(
+                    before, after, {"user": user, "amount": userBalance}
+                )
 
     def settEarn(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
-        self.sett.earn(overrides)
-        after = self.snap(trackedUsers)
+        before, after, tx = self.snapTx(trackedUsers, lambda: self.sett.earn(overrides))
         if confirm:
-            self.resolver.confirm_earn(before, after, {"user": user})
+            with get_reporter().step():
+                self.resolver.confirm_earn(before, after, {"user": user})
 
     def settWithdraw(self, amount, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
-        before = self.snap(trackedUsers)
-        tx = self.sett.withdraw(amount, overrides)
-        after = self.snap(trackedUsers)
+        before, after, tx = self.snapTx(
+            trackedUsers, lambda: self.sett.withdraw(amount, overrides)
+        )
         if confirm:
-            self.resolver.confirm_withdraw(
-                before, after, {"user": user, "amount": amount}, tx
-            )
+            with get_reporter().step():
+                self.resolver.confirm_withdraw(
+                    before, after, {"user": user, "amount": amount}, tx
+                )
 
     def settWithdrawAll(self, overrides, confirm=True):
         user = overrides["from"].address
         trackedUsers = {"user": user}
         userBalance = self.sett.balanceOf(user)
-        before = self.snap(trackedUsers)
-        tx = self.sett.withdraw(userBalance, overrides)
-        after = self.snap(trackedUsers)
+        before, after, tx = self.snapTx(
+            trackedUsers, lambda: self.sett.withdraw(userBalance, overrides)
+        )
 
         if confirm:
-            self.resolver.confirm_withdraw(
-                before, after, {"user": user, "amount": userBalance}, tx
-            )
+            with get_reporter().step():
+                self.resolver.confirm_withdraw(
+                    before, after, {"user": user, "amount": userBalance}, tx
+                )
+
+    def keyDecimals(self, key):
+        """
+        Decimals of the token a key is denominated in, 18 if not known
+        """
+        kind, _, rest = key.partition(".")
+        if kind in ("balances", "shares"):
+            token = rest.split(".")[0]
+        elif key in WANT_DENOMINATED:
+            token = "want"
+        elif key == "sett.totalSupply":
+            token = "sett"
+        else:
+            return 18
+        return self.decimals.get(token, 18)
 
     def format(self, key, value):
-        if type(value) is int:
-            if "stakingRewards.staked" or "stakingRewards.earned" in key:
-                return val(value)
-            # Ether-scaled balances
-            # TODO: Handle based on token decimals
+        if type(value) is int and not key.startswith("decimals."):
+            if "stakingRewards.staked" in key or "stakingRewards.earned" in key:
+                return val(value, self.keyDecimals(key))
+            # Token-scaled balances
             if (
                 "balance" in key
                 or key == "sett.available"
                 or key == "sett.pricePerFullShare"
                 or key == "sett.totalSupply"
             ):
-                return val(value)
+                return val(value, self.keyDecimals(key))
         return value
 
     def diff(self, a, b):
-        if type(a) is int and type(b) is int:
-            return b - a
-        else:
-            return "-"
+        return delta(a, b)
+
+    def compare(self, before: Snap, after: Snap) -> SnapDiff:
+        """
+        Keys that changed between the snaps, formatted only when printed
+        """
+        return diff_snaps(before, after)
 
     def printCompare(self, before: Snap, after: Snap):
         # self.printPermissions()
-        table = []
+        reporter = get_reporter()
+        if not reporter.enabled:
+            return
+        reporter.add("compare", self.renderCompare, self.compare(before, after))
+
+    def renderCompare(self, diff: SnapDiff):
         console.print(
             "[green]=== Compare: {} Sett {} -> {} ===[/green]".format(
-                self.key, before.block, after.block
+                self.key, diff.before_block, diff.after_block
             )
         )
 
-        for key, item in before.data.items():
-
-            a = item
-            b = after.get(key)
-
-            # Don't add items that don't change
-            if a != b:
-                table.append(
-                    [
-                        key,
-                        self.format(key, a),
-                        self.format(key, b),
-                        self.format(key, self.diff(a, b)),
-                    ]
-                )
-
-        print(
-            tabulate(
-                table, headers=["metric", "before", "after", "diff"], tablefmt="grid"
-            )
-        )
+        # Don't add items that don't change
+        print(diff.render(self.format))
 
     def printPermissions(self):
         # Accounts
@@ -6,6 +6,7 @@ from helpers.utils import (
 )
 from helpers.constants import *
 from helpers.multicall import Call, as_wei, func
+from helpers.reporting import get_reporter
 from rich.console import Console
 
 console = Console()
@@ -30,6 +31,10 @@ class StrategyCoreResolver:
         return calls
 
     def add_entity_balances_for_tokens(self, calls, tokenKey, token, entities):
+        # Immutable, served from the call cache after the first read on live networks
+        calls.append(
+            Call(token.address, [func.erc20.decimals], [["decimals." + tokenKey, None]])
+        )
         for entityKey, entity in entities.items():
             calls.append(
                 Call(
@@ -142,7 +147,7 @@ class StrategyCoreResolver:
         - Users balanceOf() want should not change
         """
 
-        console.print("=== Compare Earn ===")
+        get_reporter().print("=== Compare Earn ===")
         self.manager.printCompare(before, after)
 
         # Do nothing if there is not enough available want in sett to transfer.
@@ -179,7 +184,7 @@ class StrategyCoreResolver:
         """
         ppfs = before.get("sett.pricePerFullShare")
 
-        console.print("=== Compare Withdraw ===")
+        get_reporter().print("=== Compare Withdraw ===")
         self.manager.printCompare(before, after)
 
         if params["amount"] == 0:
@@ -256,7 +261,7 @@ class StrategyCoreResolver:
         """
 
         ppfs = before.get("sett.pricePerFullShare")
-        console.print("=== Compare Deposit ===")
+        get_reporter().print("=== Compare Deposit ===")
         self.manager.printCompare(before, after)
 
         expected_shares = Decimal(params["amount"] * Wei("1 ether")) / Decimal(ppfs)
@@ -318,7 +323,7 @@ class StrategyCoreResolver:
         """
         Verfies that the Harvest produced yield and fees
         """
-        console.print("=== Compare Harvest ===")
+        get_reporter().print("=== Compare Harvest ===")
         self.manager.printCompare(before, after)
         self.confirm_harvest_state(before, after, tx)
 
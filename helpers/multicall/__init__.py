@@ -4,7 +4,12 @@ https://github.com/banteg/multicall.py
 """
 __version__ = "0.1.1"
 
-from helpers.multicall.signature import Signature
-from helpers.multicall.call import Call
+from helpers.multicall.signature import Signature, get_signature
+from helpers.multicall.cache import CallCache, call_cache
+from helpers.multicall.call import Call, checksum
+from helpers.multicall.plan import CallPlan
 from helpers.multicall.multicall import Multicall
+from helpers.multicall.backfill import Backfill, backfill
+from helpers.multicall.coalescer import Coalescer
+from helpers.multicall.instrumentation import OpenMetrics, add_hook, log_hook
 from helpers.multicall.functions import func, as_wei
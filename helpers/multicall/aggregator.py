@@ -0,0 +1,134 @@
+"""
+Finds the aggregator contract for the connected chain
+
+Known addresses are only trusted once they have code. On development chains
+(ganache / anvil, forked or not) without one, contracts/deps/Multicall.sol is
+deployed once and reused for the rest of the session
+
+An aggregator found at the latest block can still be missing at an older
+pinned block (a snap of history from before its deployment), Multicall
+then falls back to an older aggregator or plain eth_calls, see fallbacks
+"""
+import threading
+
+from brownie import accounts, web3
+from brownie._config import CONFIG
+
+from helpers.multicall.call import Call
+from helpers.multicall.constants import MULTICALL_ADDRESSES, MULTICALL3_ADDRESSES
+
+AGGREGATE = "aggregate((address,bytes)[])(uint256,bytes[])"
+AGGREGATE_FUNCTION = "aggregate((address,bytes)[])"
+TRY_BLOCK_AND_AGGREGATE = (
+    "tryBlockAndAggregate(bool,(address,bytes)[])(uint256,bytes32,(bool,bytes)[])"
+)
+
+# chain id -> aggregator Call, or None when batches go out as JSON-RPC batches
+aggregators = {}
+# chain id -> block of the aggregator deployed here, nothing older is read
+# through it, see predates
+deploy_blocks = {}
+# Concurrent snaps resolve (and on development chains deploy) only once
+lock = threading.Lock()
+
+
+class AggregatorMissing(Exception):
+    """
+    The aggregator returned nothing, i.e. there is no code at its address
+    """
+
+
+def has_code(address):
+    return len(web3.eth.get_code(address)) > 0
+
+
+def deploy_aggregator():
+    # Project contracts are only on the brownie namespace once it is loaded
+    import brownie
+
+    return brownie.Multicall.deploy({"from": accounts[0]})
+
+
+def known_aggregators(chain_id):
+    """
+    Aggregators at known addresses of the chain, best first, code unchecked
+    """
+    return [
+        Call(addresses[chain_id], function)
+        for addresses, function in [
+            (MULTICALL3_ADDRESSES, TRY_BLOCK_AND_AGGREGATE),
+            (MULTICALL_ADDRESSES, AGGREGATE),
+        ]
+        if addresses.get(chain_id)
+    ]
+
+
+def resolve_aggregator(chain_id):
+    """
+    Multicall3 where deployed, it reports the block and per call success in
+    the same request, else the legacy aggregate, else one deployed on the spot
+    on development chains, else None
+    """
+    if chain_id in aggregators:
+        return aggregators[chain_id]
+
+    with lock:
+        if chain_id in aggregators:
+            return aggregators[chain_id]
+
+        aggregator = None
+        for candidate in known_aggregators(chain_id):
+            if has_code(candidate.target):
+                aggregator = candidate
+                break
+        else:
+            if CONFIG.network_type == "development" and len(accounts) > 0:
+                deployed = deploy_aggregator()
+                deploy_blocks[chain_id] = deployed.tx.block_number
+                aggregator = Call(deployed.address, AGGREGATE)
+
+        aggregators[chain_id] = aggregator
+        return aggregator
+
+
+def predates(chain_id, block_id):
+    """
+    True for a pinned block before the aggregator deployed here existed
+    """
+    block = deploy_blocks.get(chain_id)
+    return block is not None and isinstance(block_id, int) and block_id < block
+
+
+def fallbacks(chain_id, aggregator):
+    """
+    What to try at a block the aggregator has no code at: the legacy
+    aggregate, deployed long before Multicall3 on most chains, then None,
+    i.e. a JSON-RPC batch, which reads any block the node has state for
+    """
+    legacy = MULTICALL_ADDRESSES.get(chain_id)
+    if (
+        aggregator is not None
+        and aggregator.function != AGGREGATE
+        and legacy
+        and has_code(legacy)
+    ):
+        return [Call(legacy, AGGREGATE), None]
+    return [None]
+
+
+def forget_aggregator(chain_id):
+    """
+    Drops what was found for the chain, e.g. after the chain was reverted
+    to before the local deployment
+    """
+    with lock:
+        aggregators.pop(chain_id, None)
+        deploy_blocks.pop(chain_id, None)
+
+
+def register_aggregator(chain_id, address, function=AGGREGATE, block=None):
+    with lock:
+        aggregators[chain_id] = Call(address, function)
+        deploy_blocks.pop(chain_id, None)
+        if block is not None:
+            deploy_blocks[chain_id] = block
@@ -0,0 +1,278 @@
+"""
+Asyncio flavour of Call / Multicall for monitors and keepers
+
+Takes the same call specs as Call and shares its encoding / decoding, but
+awaits an async web3 provider so many aggregates can be in flight on one
+event loop:
+
+    vaults = await asyncio.gather(
+        *[AsyncMulticall(calls, block_id=block)() for calls in vault_calls]
+    )
+"""
+import asyncio
+import time
+import weakref
+from functools import partial
+from typing import List
+
+from aiohttp import ClientResponseError
+from brownie import web3
+from web3 import Web3
+from web3.eth import AsyncEth
+from web3.providers.async_rpc import AsyncHTTPProvider
+
+from helpers.multicall.aggregator import (
+    AGGREGATE,
+    AggregatorMissing,
+    aggregators,
+    forget_aggregator,
+    known_aggregators,
+    predates,
+)
+from helpers.multicall.cache import call_cache
+from helpers.multicall.call import Call
+from helpers.multicall.constants import (
+    MULTICALL_CHUNK_BYTES,
+    MULTICALL_ADDRESSES,
+    MULTICALL_CHUNK_GAS,
+    MULTICALL_WORKERS,
+    RPC_THROTTLE_BACKOFF,
+    RPC_THROTTLE_RETRIES,
+)
+from helpers.multicall.instrumentation import BatchStats, Timer, emit
+from helpers.multicall.multicall import Multicall
+from helpers.multicall.transport import get_transport, reverted
+
+async_web3s = {}
+# Chain ids by async web3, a node does not change chains under a connection
+chain_ids = weakref.WeakKeyDictionary()
+# Chains an async lookup found no aggregator on, see resolve_aggregator
+no_aggregator = set()
+
+
+def get_async_web3(endpoint_uri=None):
+    """
+    Async web3 for the given node, defaults to the node brownie is connected to
+    """
+    endpoint_uri = endpoint_uri or web3.provider.endpoint_uri
+    if endpoint_uri not in async_web3s:
+        async_web3s[endpoint_uri] = Web3(
+            AsyncHTTPProvider(endpoint_uri),
+            modules={"eth": (AsyncEth,)},
+            middlewares=[],
+        )
+    return async_web3s[endpoint_uri]
+
+
+async def limited_call(w3, tx, block_id):
+    """
+    Transport.limited for coroutines: the eth_call takes a slot of the same
+    adaptive window as the sync transport, 429s are backed off and retried
+    """
+    limiter = get_transport().limiter
+    for attempt in range(RPC_THROTTLE_RETRIES + 1):
+        async with limiter.async_slot() as ticket:
+            start = time.monotonic()
+            try:
+                output = await w3.eth.call(tx, block_id)
+            except asyncio.TimeoutError:
+                limiter.timed_out(ticket)
+                raise
+            except ClientResponseError as e:
+                if e.status != 429 or attempt == RPC_THROTTLE_RETRIES:
+                    raise
+                limiter.throttled(ticket)
+            else:
+                limiter.succeeded(time.monotonic() - start)
+                return output
+        await asyncio.sleep(RPC_THROTTLE_BACKOFF * 2 ** attempt)
+
+
+async def get_chain_id(w3):
+    if w3 not in chain_ids:
+        chain_ids[w3] = await w3.eth.chain_id
+    return chain_ids[w3]
+
+
+async def has_code(w3, address):
+    return len(await w3.eth.get_code(address)) > 0
+
+
+async def resolve_aggregator(w3, chain_id):
+    """
+    resolve_aggregator through the async web3, shares what it finds with the
+    sync side but never deploys: without an aggregator the calls go out as
+    plain eth_calls
+    """
+    if chain_id in aggregators:
+        return aggregators[chain_id]
+    if chain_id in no_aggregator:
+        return None
+    for candidate in known_aggregators(chain_id):
+        if await has_code(w3, candidate.target):
+            return aggregators.setdefault(chain_id, candidate)
+    # Not shared, a sync lookup may still deploy one on development chains
+    no_aggregator.add(chain_id)
+    return None
+
+
+async def fallbacks(w3, chain_id, aggregator):
+    """
+    Same as aggregator.fallbacks: the legacy aggregate, then plain eth_calls
+    """
+    legacy = MULTICALL_ADDRESSES.get(chain_id)
+    if (
+        aggregator is not None
+        and aggregator.function != AGGREGATE
+        and legacy
+        and await has_code(w3, legacy)
+    ):
+        return [Call(legacy, AGGREGATE), None]
+    return [None]
+
+
+class AsyncCall(Call):
+    def __init__(self, target, function, returns=None, w3=None):
+        super().__init__(target, function, returns)
+        self.w3 = w3
+
+    async def __call__(self, args=None, block_id=None):
+        args = args or self.args
+        calldata = self.signature.encode_data(args)
+        w3 = self.w3 or get_async_web3()
+        chain_id = await get_chain_id(w3)
+        output = call_cache.get(block_id, self.target, calldata, chain_id)
+        if output is None:
+            tx = {"to": self.target, "data": calldata}
+            output = await limited_call(w3, tx, block_id)
+            call_cache.set(block_id, self.target, calldata, output, chain_id)
+        return self.decode_output(output)
+
+
+class AsyncMulticall(Multicall):
+    def __init__(
+        self,
+        calls: List[Call],
+        block_id=None,
+        chunk_gas=MULTICALL_CHUNK_GAS,
+        chunk_bytes=MULTICALL_CHUNK_BYTES,
+        workers=MULTICALL_WORKERS,
+        cache=call_cache,
+        label=None,
+        w3=None,
+    ):
+        super().__init__(calls, block_id, chunk_gas, chunk_bytes, workers, cache, label)
+        self.w3 = w3 or get_async_web3()
+
+    async def aggregate(self, aggregator, chunk, block_id):
+        timer = Timer()
+        tx = self.aggregate_tx(aggregator, chunk)
+        encode = timer.lap()
+        output = await limited_call(self.w3, tx, block_id)
+        rpc = timer.lap()
+        if not output:
+            raise AggregatorMissing(aggregator.target)
+        result = self.aggregate_outputs(aggregator, output)
+        self.stats.record_chunk(len(tx["data"]), len(output), encode, rpc, timer.lap())
+        return result
+
+    async def eth_calls(self, chunk, block_id):
+        """
+        Without an aggregator every call of the chunk is its own eth_call,
+        calls that revert come back as None
+        """
+        timer = Timer()
+        if block_id in (None, "latest"):
+            block_id = await self.w3.eth.block_number
+
+        async def try_call(call, data):
+            try:
+                return await limited_call(
+                    self.w3, {"to": call.target, "data": data}, block_id
+                )
+            except ValueError as e:
+                if not reverted(e):
+                    raise
+                return None
+
+        outputs = await asyncio.gather(
+            *[try_call(call, data) for _, call, data in chunk]
+        )
+        self.stats.record_chunk(
+            sum(len(data) for _, _, data in chunk),
+            sum(len(output or b"") for output in outputs),
+            0,
+            timer.lap(),
+            0,
+        )
+        return block_id, outputs
+
+    async def aggregator(self, chain_id):
+        return await resolve_aggregator(self.w3, chain_id)
+
+    async def fetch(self):
+        """
+        Multicall.fetch on the event loop, code checks go through self.w3
+        """
+        chain_id = await get_chain_id(self.w3)
+        # The cache is keyed by the chain of self.w3, not brownie's
+        self.chain_id = chain_id
+        aggregator = await self.aggregator(chain_id)
+        if not predates(chain_id, self.block_id):
+            try:
+                return await self.run(aggregator)
+            except AggregatorMissing:
+                if not await has_code(self.w3, aggregator.target):
+                    # The chain went back to before the aggregator was deployed
+                    forget_aggregator(chain_id)
+                    aggregator = await self.aggregator(chain_id)
+                    try:
+                        return await self.run(aggregator)
+                    except AggregatorMissing:
+                        pass
+        # The pinned block predates the aggregator
+        for fallback in await fallbacks(self.w3, chain_id, aggregator):
+            try:
+                return await self.run(fallback)
+            except AggregatorMissing:
+                continue
+
+    async def run(self, aggregator):
+        if aggregator:
+            aggregate = partial(self.aggregate, aggregator)
+        else:
+            aggregate = self.eth_calls
+
+        self.stats = BatchStats(self.stats.label)
+        block_id = self.block_id
+        timer = Timer()
+        outputs, misses = self.lookup(block_id)
+        chunks = self.chunks(misses)
+        self.stats.encode_time += timer.lap()
+        self.stats.calls = len(self.calls)
+        self.stats.cached = len(outputs)
+
+        # Same pinning as Multicall: the first chunk fixes the block
+        results = []
+        if chunks and block_id is None:
+            results.append(await aggregate(chunks[0], "latest"))
+            block_id = results[0][0]
+
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def dispatch(chunk):
+            async with semaphore:
+                return await aggregate(chunk, block_id)
+
+        results += await asyncio.gather(
+            *[dispatch(chunk) for chunk in chunks[len(results) :]]
+        )
+        self.block = results[0][0] if results else block_id
+        self.stats.block = self.block
+        self.store(outputs, chunks, results, self.block_id)
+        return outputs
+
+    async def __call__(self):
+        result = self.decode(await self.fetch())
+        emit(self.stats)
+        return result
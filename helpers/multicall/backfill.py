@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+from helpers.multicall.call import Call
+from helpers.multicall.constants import BACKFILL_WORKERS
+from helpers.multicall.multicall import Multicall
+
+
+class Backfill:
+    """
+    Columnar history of a call list: one list of values per key,
+    indexed the same way as blocks
+    """
+
+    def __init__(self, blocks, columns):
+        self.blocks = blocks
+        self.columns = columns
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def keys(self):
+        return self.columns.keys()
+
+    def at(self, block):
+        index = self.blocks.index(block)
+        return {key: column[index] for key, column in self.columns.items()}
+
+
+def backfill(
+    calls: List[Call], blocks: Iterable[int], workers=BACKFILL_WORKERS
+) -> Backfill:
+    """
+    Runs the same multicall at every block (a range or list of block numbers),
+    at most `workers` blocks at a time
+    """
+    blocks = list(blocks)
+
+    def read(block):
+        # Concurrency is bounded across blocks, chunks of one block run in turn
+        return Multicall(calls, block_id=block, workers=1)()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(read, blocks))
+
+    columns = {}
+    for index, result in enumerate(results):
+        for key, value in result.items():
+            if key not in columns:
+                columns[key] = [None] * len(blocks)
+            columns[key][index] = value
+
+    return Backfill(blocks, columns)
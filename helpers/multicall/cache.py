@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+
+from brownie import web3
+from brownie._config import CONFIG
+from eth_utils import function_signature_to_4byte_selector
+
+from helpers.multicall.constants import CALL_CACHE_SIZE, IMMUTABLE_GETTERS
+
+
+class CallCache:
+    """
+    LRU cache of raw eth_call outputs keyed by (chain, block, target, calldata)
+    Only reads pinned to a block number are cached, except for immutable
+    getters which are cached for the session whatever the block. Other
+    reads are counted as uncacheable, not as misses
+
+    Off on development networks: after chain.revert() / undo() or between
+    isolated tests the same block number (or address) holds different state
+    """
+
+    def __init__(
+        self,
+        maxsize=CALL_CACHE_SIZE,
+        immutable=IMMUTABLE_GETTERS,
+        development=False,
+    ):
+        self.maxsize = maxsize
+        self.development = development
+        self.entries = OrderedDict()
+        self.immutable = {}
+        self.immutable_selectors = {
+            function_signature_to_4byte_selector(getter) for getter in immutable
+        }
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.lock = threading.Lock()
+
+    def active(self):
+        return self.development or CONFIG.network_type != "development"
+
+    def key(self, block, target, data, chain_id=None):
+        """
+        chain_id defaults to the chain brownie is connected to
+        """
+        if not self.active():
+            return None
+        if chain_id is None:
+            chain_id = web3.chain_id
+        data = bytes(data)
+        if data[:4] in self.immutable_selectors:
+            return None, chain_id, target, data
+        if isinstance(block, int):
+            return block, chain_id, target, data
+        # Not cacheable: latest / pending change under our feet
+        return None
+
+    def get(self, block, target, data, chain_id=None):
+        key = self.key(block, target, data, chain_id)
+        with self.lock:
+            if key is None:
+                self.uncacheable += 1
+                return None
+            if key[0] is None:
+                output = self.immutable.get(key)
+            else:
+                output = self.entries.get(key)
+                if output is not None:
+                    self.entries.move_to_end(key)
+            if output is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return output
+
+    def set(self, block, target, data, output, chain_id=None):
+        key = self.key(block, target, data, chain_id)
+        if key is None:
+            return
+        with self.lock:
+            if key[0] is None:
+                self.immutable[key] = output
+                return
+            self.entries[key] = output
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.immutable.clear()
+            self.hits = 0
+            self.misses = 0
+            self.uncacheable = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncacheable": self.uncacheable,
+            "entries": len(self.entries),
+            "immutable": len(self.immutable),
+        }
+
+
+call_cache = CallCache()
@@ -1,23 +1,39 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/call.py
+from functools import lru_cache
+
 from eth_utils import to_checksum_address
-from brownie import web3
-from helpers.multicall import Signature
+from helpers.multicall.cache import call_cache
+from helpers.multicall.signature import get_signature
+from helpers.multicall.constants import ADDRESS_CACHE_SIZE
+from helpers.multicall.transport import get_transport
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def checksum(address):
+    """
+    Cached to_checksum_address, snapshots keep asking for the same few targets
+    """
+    return to_checksum_address(address)
 
 
 class Call:
     def __init__(self, target, function, returns=None):
-        self.target = to_checksum_address(target)
+        self.target = checksum(target)
         if isinstance(function, list):
             self.function, *self.args = function
         else:
             self.function = function
             self.args = None
-        self.signature = Signature(self.function)
+        self.signature = get_signature(self.function)
         self.returns = returns
+        self._data = None
 
     @property
     def data(self):
-        return self.signature.encode_data(self.args)
+        # Args are fixed at construction, so is the calldata
+        if self._data is None:
+            self._data = self.signature.encode_data(self.args)
+        return self._data
 
     def decode_output(self, output):
         decoded = self.signature.decode_data(output)
@@ -29,8 +45,12 @@ class Call:
         else:
             return decoded if len(decoded) > 1 else decoded[0]
 
-    def __call__(self, args=None):
+    def __call__(self, args=None, block_id=None):
         args = args or self.args
         calldata = self.signature.encode_data(args)
-        output = web3.eth.call({"to": self.target, "data": calldata})
+        output = call_cache.get(block_id, self.target, calldata)
+        if output is None:
+            tx = {"to": self.target, "data": calldata}
+            output = get_transport().call(tx, block_id)
+            call_cache.set(block_id, self.target, calldata, output)
         return self.decode_output(output)
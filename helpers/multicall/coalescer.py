@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import Future
+
+from helpers.multicall.call import Call
+from helpers.multicall.constants import COALESCE_MAX_CALLS, COALESCE_WINDOW
+from helpers.multicall.instrumentation import emit
+from helpers.multicall.multicall import Multicall, empty, failed
+
+
+class Coalescer:
+    """
+    Dataloader style front end to Multicall
+    Calls submitted from any thread within `window` seconds (or until
+    `max_calls` are waiting) for the same block are deduplicated by
+    (target, calldata), sent as one aggregate and fanned back out
+
+    Threads block on coalescer.call(...) / coalescer.multicall(...),
+    asyncio tasks can await asyncio.wrap_future(coalescer.submit(...))
+    """
+
+    def __init__(self, window=COALESCE_WINDOW, max_calls=COALESCE_MAX_CALLS):
+        self.window = window
+        self.max_calls = max_calls
+        self.lock = threading.Lock()
+        # block_id -> {(target, calldata): (call, [(caller's call, future)])}
+        self.pending = {}
+        self.timers = {}
+        self.submitted = 0
+        self.sent = 0
+        self.batches = 0
+
+    def submit(self, call: Call, block_id=None) -> Future:
+        """
+        Queues the call, the future resolves to what call.decode_output gives
+        """
+        future = Future()
+        key = (call.target, call.data)
+        flush = False
+        with self.lock:
+            self.submitted += 1
+            batch = self.pending.setdefault(block_id, {})
+            if key in batch:
+                batch[key][1].append((call, future))
+            else:
+                batch[key] = (call, [(call, future)])
+            if len(batch) >= self.max_calls:
+                flush = True
+            elif block_id not in self.timers:
+                timer = threading.Timer(self.window, self.flush, [block_id])
+                timer.daemon = True
+                self.timers[block_id] = timer
+                timer.start()
+        if flush:
+            self.flush(block_id)
+        return future
+
+    def flush(self, block_id=None):
+        with self.lock:
+            batch = self.pending.pop(block_id, None)
+            timer = self.timers.pop(block_id, None)
+            if batch:
+                self.sent += len(batch)
+                self.batches += 1
+        if timer:
+            timer.cancel()
+        if not batch:
+            return
+
+        entries = list(batch.values())
+        multi = Multicall(
+            [call for call, _ in entries], block_id=block_id, label="coalesced"
+        )
+        try:
+            outputs = multi.fetch()
+        except Exception as e:
+            for _, waiters in entries:
+                for _, future in waiters:
+                    future.set_exception(e)
+            return
+
+        for index, (_, waiters) in enumerate(entries):
+            output = outputs[index]
+            for call, future in waiters:
+                try:
+                    if failed(call, output):
+                        future.set_result(empty(call))
+                    else:
+                        future.set_result(call.decode_output(output))
+                except Exception as e:
+                    future.set_exception(e)
+        emit(multi.stats)
+
+    def call(self, call: Call, block_id=None):
+        return self.submit(call, block_id).result()
+
+    def multicall(self, calls, block_id=None):
+        """
+        Same result as Multicall(calls, block_id)(), shared with other callers
+        """
+        futures = [self.submit(call, block_id) for call in calls]
+        result = {}
+        for future in futures:
+            result.update(future.result())
+        return result
+
+    def stats(self):
+        return {"submitted": self.submitted, "sent": self.sent, "batches": self.batches}
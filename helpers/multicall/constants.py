@@ -1,6 +1,56 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/constants.py
 from enum import IntEnum
 
+# Upper bounds for the interned signature and checksummed address registries
+SIGNATURE_CACHE_SIZE = 1024
+ADDRESS_CACHE_SIZE = 4096
+
+# Multicall batches are split so no single aggregate eth_call goes over these
+CALL_GAS_ESTIMATE = 20000  # rough upper bound for a view call + calldata
+CALLDATA_GAS_PER_BYTE = 16
+MULTICALL_CHUNK_GAS = 10000000
+MULTICALL_CHUNK_BYTES = 64 * 1024
+# Chunks of the same batch are dispatched concurrently on this many threads
+MULTICALL_WORKERS = 8
+# Blocks read concurrently when backfilling history
+BACKFILL_WORKERS = 8
+# Seconds before a raw JSON-RPC request to the node is abandoned
+RPC_TIMEOUT = 30
+# Pooled transport: keep-alive connections per endpoint, how much each new
+# latency sample moves the average, and how long a failing endpoint sits out
+RPC_POOL_SIZE = 16
+RPC_LATENCY_SMOOTHING = 0.2
+RPC_ENDPOINT_COOLDOWN = 5
+RPC_ENDPOINT_MAX_COOLDOWN = 60
+
+# Adaptive (AIMD) concurrency window shared by all multicall traffic: grows by
+# one request per window of responses under the target latency, halves when
+# the provider throttles (HTTP 429) or times out
+RPC_WINDOW_INITIAL = 8
+RPC_WINDOW_MIN = 1
+RPC_WINDOW_MAX = 64
+RPC_WINDOW_DECREASE = 0.5
+RPC_TARGET_LATENCY = 2
+RPC_THROTTLE_RETRIES = 5
+RPC_THROTTLE_BACKOFF = 0.25
+
+# Coalescer: seconds calls wait for company, and the batch size that flushes early
+COALESCE_WINDOW = 0.01
+COALESCE_MAX_CALLS = 500
+
+# Entries kept by the (block, target, calldata) eth_call result cache
+CALL_CACHE_SIZE = 16384
+# Getters whose value is fixed for a deployment, cached regardless of block
+IMMUTABLE_GETTERS = {
+    "decimals()",
+    "name()",
+    "symbol()",
+    "want()",
+    "token()",
+    "controller()",
+    "PANGOLIN_ROUTER()",
+}
+
 
 class Network(IntEnum):
     Mainnet = 1
@@ -10,7 +60,7 @@ class Network(IntEnum):
     xDai = 100
     Forknet = 1337
     BSC = 56
-    Avalanche = 43112
+    Avalanche = 43114
 
 
 MULTICALL_ADDRESSES = {
@@ -23,3 +73,19 @@ MULTICALL_ADDRESSES = {
     Network.BSC: "0xec8c00da6ce45341fb8c31653b598ca0d8251804",
     Network.Avalanche: "0x12097e9755aBf710166D0027c1a2ef7609833D74",
 }
+
+# Multicall3 (https://github.com/mds1/multicall) lives at the same address on
+# every chain it is deployed to and reports block + per call success
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ADDRESSES = {
+    network: MULTICALL3_ADDRESS
+    for network in [
+        Network.Mainnet,
+        Network.Kovan,
+        Network.Rinkeby,
+        Network.Görli,
+        Network.xDai,
+        Network.BSC,
+        Network.Avalanche,
+    ]
+}
@@ -0,0 +1,60 @@
+"""
+Zero-copy decoding of the aggregate return envelopes
+
+Walks the ABI offsets of the returned buffer through a memoryview and hands
+back slices of it, instead of eth_abi copying the buffer and every output
+into new bytes objects that are then decoded a second time per call
+"""
+
+
+def _word(view, offset):
+    return int.from_bytes(view[offset : offset + 32], "big")
+
+
+def _bytes_at(view, start):
+    """
+    ABI `bytes` stored at start: a length word followed by the data
+    """
+    length = _word(view, start)
+    end = start + 32 + length
+    if end > len(view):
+        raise ValueError("Aggregate output truncated at byte {}".format(end))
+    if length <= 32:
+        # A memoryview object outweighs copying a single word
+        return view.obj[start + 32 : end]
+    return view[start + 32 : end]
+
+
+def decode_aggregate(output):
+    """
+    aggregate((address,bytes)[]) returns (uint256 block, bytes[] outputs)
+    """
+    view = memoryview(output)
+    block = _word(view, 0)
+    array = _word(view, 32)
+    count = _word(view, array)
+    base = array + 32
+    return (
+        block,
+        [_bytes_at(view, base + _word(view, base + 32 * i)) for i in range(count)],
+    )
+
+
+def decode_try_block_and_aggregate(output):
+    """
+    tryBlockAndAggregate returns (uint256 block, bytes32 hash, (bool,bytes)[]),
+    outputs of calls that failed are None
+    """
+    view = memoryview(output)
+    block = _word(view, 0)
+    array = _word(view, 64)
+    count = _word(view, array)
+    base = array + 32
+    outputs = []
+    for i in range(count):
+        result = base + _word(view, base + 32 * i)
+        if _word(view, result):
+            outputs.append(_bytes_at(view, result + _word(view, result + 32)))
+        else:
+            outputs.append(None)
+    return block, outputs
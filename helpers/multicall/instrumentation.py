@@ -0,0 +1,163 @@
+"""
+Per batch Multicall instrumentation
+
+Every batch reports a BatchStats to the registered hooks:
+
+    add_hook(log_hook)                    # one logging line per batch
+    metrics = OpenMetrics(); add_hook(metrics)
+    print(metrics.render())               # OpenMetrics text exposition
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger("helpers.multicall")
+
+hooks = []
+
+
+class BatchStats:
+    """
+    What one Multicall batch cost. Encode, RPC and decode times are summed
+    over chunks, which may overlap when chunks run in parallel
+    """
+
+    def __init__(self, label=None):
+        self.label = label
+        self.block = None
+        self.calls = 0
+        self.cached = 0
+        self.failed = 0
+        self.chunks = 0
+        self.calldata_bytes = 0
+        self.response_bytes = 0
+        self.encode_time = 0
+        self.rpc_time = 0
+        self.decode_time = 0
+        self.lock = threading.Lock()
+
+    def record_chunk(self, calldata_bytes, response_bytes, encode, rpc, decode):
+        with self.lock:
+            self.chunks += 1
+            self.calldata_bytes += calldata_bytes
+            self.response_bytes += response_bytes
+            self.encode_time += encode
+            self.rpc_time += rpc
+            self.decode_time += decode
+
+    def as_dict(self):
+        return {
+            "label": self.label,
+            "block": self.block,
+            "calls": self.calls,
+            "cached": self.cached,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "calldata_bytes": self.calldata_bytes,
+            "response_bytes": self.response_bytes,
+            "encode_time": self.encode_time,
+            "rpc_time": self.rpc_time,
+            "decode_time": self.decode_time,
+        }
+
+
+class Timer:
+    """
+    Stopwatch handing out the seconds elapsed since the previous lap
+    """
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def lap(self):
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.last = now
+        return elapsed
+
+
+def add_hook(hook):
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    hooks.remove(hook)
+
+
+def emit(stats: BatchStats):
+    for hook in hooks:
+        hook(stats)
+
+
+def log_hook(stats: BatchStats):
+    logger.info(
+        "multicall %s block=%s calls=%d cached=%d failed=%d chunks=%d "
+        "calldata=%dB response=%dB encode=%.1fms rpc=%.1fms decode=%.1fms",
+        stats.label or "-",
+        stats.block,
+        stats.calls,
+        stats.cached,
+        stats.failed,
+        stats.chunks,
+        stats.calldata_bytes,
+        stats.response_bytes,
+        stats.encode_time * 1000,
+        stats.rpc_time * 1000,
+        stats.decode_time * 1000,
+    )
+
+
+class OpenMetrics:
+    """
+    Hook accumulating batch stats per label, rendered as OpenMetrics text
+    """
+
+    COUNTERS = [
+        ("batches", "Multicall batches sent", None),
+        ("calls", "Calls across all batches", "calls"),
+        ("cached", "Calls served from the cache", "cached"),
+        ("failed", "Calls that reverted", "failed"),
+        ("chunks", "Aggregate requests sent", "chunks"),
+        ("calldata_bytes", "Aggregate calldata bytes sent", "calldata_bytes"),
+        ("response_bytes", "Aggregate response bytes received", "response_bytes"),
+        ("encode_seconds", "Time spent encoding", "encode_time"),
+        ("rpc_seconds", "Time spent waiting on the node", "rpc_time"),
+        ("decode_seconds", "Time spent decoding", "decode_time"),
+    ]
+
+    def __init__(self, prefix="multicall"):
+        self.prefix = prefix
+        self.totals = {}
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, stats: BatchStats):
+        label = stats.label or ""
+        with self.lock:
+            totals = self.totals.setdefault(
+                label, {name: 0 for name, _, _ in self.COUNTERS}
+            )
+            totals["batches"] += 1
+            for name, _, attribute in self.COUNTERS[1:]:
+                totals[name] += getattr(stats, attribute)
+            if stats.block is not None:
+                self.blocks[label] = stats.block
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, description, _ in self.COUNTERS:
+                metric = "{}_{}".format(self.prefix, name)
+                lines.append("# TYPE {} counter".format(metric))
+                lines.append("# HELP {} {}".format(metric, description))
+                for label, totals in self.totals.items():
+                    lines.append(
+                        '{}_total{{label="{}"}} {}'.format(metric, label, totals[name])
+                    )
+            metric = "{}_block".format(self.prefix)
+            lines.append("# TYPE {} gauge".format(metric))
+            lines.append("# HELP {} Block of the latest batch".format(metric))
+            for label, block in self.blocks.items():
+                lines.append('{}{{label="{}"}} {}'.format(metric, label, block))
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+from helpers.multicall.constants import (
+    RPC_TARGET_LATENCY,
+    RPC_WINDOW_DECREASE,
+    RPC_WINDOW_INITIAL,
+    RPC_WINDOW_MAX,
+    RPC_WINDOW_MIN,
+)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency control: at most `window` requests in flight, the window
+    grows additively while responses come back under the target latency and
+    shrinks multiplicatively when the provider throttles or times out
+
+    Every slot gets a ticket, the window shrinks at most once per window of
+    requests: failures of requests sent before the last decrease are counted
+    but do not shrink it again, a burst of 429s costs one halving
+    """
+
+    def __init__(
+        self,
+        initial=RPC_WINDOW_INITIAL,
+        minimum=RPC_WINDOW_MIN,
+        maximum=RPC_WINDOW_MAX,
+        decrease=RPC_WINDOW_DECREASE,
+        target_latency=RPC_TARGET_LATENCY,
+    ):
+        self.window = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.local = threading.local()
+        self.tickets = 0
+        # First ticket sent after the last decrease
+        self.recovery = 0
+        self.requests = 0
+        self.throttles = 0
+        self.timeouts = 0
+
+    def take(self):
+        self.in_flight += 1
+        self.tickets += 1
+        return self.tickets - 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def slot(self):
+        with self.condition:
+            while self.in_flight >= int(self.window):
+                self.condition.wait()
+            ticket = self.take()
+        self.local.ticket = ticket
+        try:
+            yield ticket
+        finally:
+            self.local.ticket = None
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self, poll=0.01):
+        """
+        slot() for coroutines, waits on the event loop instead of blocking it
+        """
+        while True:
+            with self.condition:
+                if self.in_flight < int(self.window):
+                    ticket = self.take()
+                    break
+            await asyncio.sleep(poll)
+        try:
+            yield ticket
+        finally:
+            self.release()
+
+    def succeeded(self, latency):
+        with self.condition:
+            self.requests += 1
+            if latency <= self.target_latency:
+                # +1 once a full window of healthy responses came back
+                self.window = min(self.maximum, self.window + 1 / self.window)
+                self.condition.notify()
+
+    def shrink(self, ticket=None):
+        if ticket is None:
+            ticket = getattr(self.local, "ticket", None)
+        if ticket is not None and ticket < self.recovery:
+            # Sent before the last decrease, which already accounted for it
+            return
+        self.window = max(self.minimum, self.window * self.decrease)
+        self.recovery = self.tickets
+
+    def throttled(self, ticket=None):
+        with self.condition:
+            self.requests += 1
+            self.throttles += 1
+            self.shrink(ticket)
+
+    def timed_out(self, ticket=None):
+        with self.condition:
+            self.requests += 1
+            self.timeouts += 1
+            self.shrink(ticket)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "window": int(self.window),
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "throttles": self.throttles,
+                "timeouts": self.timeouts,
+            }
+
+
+limiter = AdaptiveLimiter()
@@ -1,18 +1,78 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/multicall.py
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Union
 
 from brownie import web3
 
 from helpers.multicall import Call
-from helpers.multicall.constants import MULTICALL_ADDRESSES
+from helpers.multicall.aggregator import (
+    AGGREGATE,
+    AggregatorMissing,
+    fallbacks,
+    forget_aggregator,
+    has_code,
+    predates,
+    resolve_aggregator,
+)
+from helpers.multicall.cache import call_cache
+from helpers.multicall.constants import (
+    CALL_GAS_ESTIMATE,
+    CALLDATA_GAS_PER_BYTE,
+    MULTICALL_CHUNK_BYTES,
+    MULTICALL_CHUNK_GAS,
+    MULTICALL_WORKERS,
+)
+from helpers.multicall.envelope import (
+    decode_aggregate,
+    decode_try_block_and_aggregate,
+)
+from helpers.multicall.instrumentation import BatchStats, Timer, emit
+from helpers.multicall.plan import CallPlan
+from helpers.multicall.transport import get_transport
 from rich.console import Console
 
 console = Console()
 
 
+def failed(call, output):
+    # Calling code-less addresses "succeeds" with empty return data
+    return output is None or (not output and call.signature.output_types != "()")
+
+
+def empty(call):
+    """
+    What a failed call decodes to: None for every key it returns
+    """
+    return {name: None for name, _ in call.returns or []}
+
+
 class Multicall:
-    def __init__(self, calls: List[Call]):
-        self.calls = calls
+    def __init__(
+        self,
+        calls: Union[List[Call], CallPlan],
+        block_id=None,
+        chunk_gas=MULTICALL_CHUNK_GAS,
+        chunk_bytes=MULTICALL_CHUNK_BYTES,
+        workers=MULTICALL_WORKERS,
+        cache=call_cache,
+        label=None,
+    ):
+        self.plan = calls if isinstance(calls, CallPlan) else CallPlan(calls)
+        self.calls = self.plan.calls
+        self.block_id = block_id
+        self.chunk_gas = chunk_gas
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        self.cache = cache
+        # Chain the cache is keyed by, None for the one brownie is connected to
+        self.chain_id = None
+        # Block the results were read at, known once the batch has run
+        self.block = None
+        # Calls that reverted (or returned nothing), their keys come back as None
+        self.failed = []
+        # Cost of the last run, handed to the instrumentation hooks
+        self.stats = BatchStats(label)
 
     def printCalls(self):
         for call in self.calls:
@@ -20,14 +80,195 @@ class Multicall:
                 {"target": call.target, "function": call.function, "args": call.args}
             )
 
-    def __call__(self):
-        aggregate = Call(
-            MULTICALL_ADDRESSES[web3.eth.chainId],
-            "aggregate((address,bytes)[])(uint256,bytes[])",
+    def lookup(self, block_id):
+        """
+        Serves what it can from the cache, returns ({index: output}, misses)
+        where misses are the [(index, call, calldata)] left to fetch
+        """
+        outputs = {}
+        if not self.cache:
+            return outputs, list(self.plan.requests)
+        misses = []
+        for request in self.plan.requests:
+            index, call, data = request
+            output = self.cache.get(block_id, call.target, data, self.chain_id)
+            if output is None:
+                misses.append(request)
+            else:
+                outputs[index] = output
+        return outputs, misses
+
+    def chunks(self, requests):
+        """
+        Splits [(index, call, calldata)] into batches whose estimated gas and
+        calldata size each fit into a single aggregate eth_call
+        """
+        chunks = []
+        chunk, gas, size = [], 0, 0
+        for request in requests:
+            data = request[2]
+            call_gas = CALL_GAS_ESTIMATE + CALLDATA_GAS_PER_BYTE * len(data)
+            if chunk and (
+                gas + call_gas > self.chunk_gas or size + len(data) > self.chunk_bytes
+            ):
+                chunks.append(chunk)
+                chunk, gas, size = [], 0, 0
+            chunk.append(request)
+            gas += call_gas
+            size += len(data)
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def aggregate_tx(self, aggregator, chunk):
+        # The same plan chunked the same way always packs to the same bytes
+        key = (aggregator.target, aggregator.function, tuple(r[0] for r in chunk))
+        encoded = self.plan.aggregates.get(key)
+        if encoded is None:
+            calls = [[call.target, data] for _, call, data in chunk]
+            if aggregator.function == AGGREGATE:
+                args = [calls]
+            else:
+                # Multicall3 without requireSuccess, reverts come back as flags
+                args = [False, calls]
+            encoded = aggregator.signature.encode_data(args)
+            self.plan.aggregates[key] = encoded
+        return {"to": aggregator.target, "data": encoded}
+
+    def aggregate_outputs(self, aggregator, output):
+        """
+        Unpacks an aggregate return into (block, outputs), outputs of calls
+        that reverted are None and the rest are memoryview slices of the return
+        """
+        if aggregator.function == AGGREGATE:
+            return decode_aggregate(output)
+        return decode_try_block_and_aggregate(output)
+
+    def aggregate(self, aggregator, chunk, block_id):
+        timer = Timer()
+        tx = self.aggregate_tx(aggregator, chunk)
+        encode = timer.lap()
+        output = get_transport().call(tx, block_id)
+        rpc = timer.lap()
+        if not output:
+            raise AggregatorMissing(aggregator.target)
+        result = self.aggregate_outputs(aggregator, output)
+        self.stats.record_chunk(len(tx["data"]), len(output), encode, rpc, timer.lap())
+        return result
+
+    def batch(self, chunk, block_id):
+        """
+        Fallback for chains without a known aggregator: the chunk goes out as
+        one JSON-RPC batch of plain eth_calls instead
+        """
+        timer = Timer()
+        txs = [{"to": call.target, "data": data} for _, call, data in chunk]
+        result = get_transport().batch_call(txs, block_id)
+        self.stats.record_chunk(
+            sum(len(tx["data"]) for tx in txs),
+            sum(len(output or b"") for output in result[1]),
+            0,
+            timer.lap(),
+            0,
         )
-        args = [[[call.target, call.data] for call in self.calls]]
-        block, outputs = aggregate(args)
+        return result
+
+    def store(self, outputs, chunks, results, block_id=None):
+        """
+        Files the [(block, outputs)] of every chunk by call index and caches them
+        under the requested block, or the block read at if none was pinned
+        """
+        for chunk, (block, chunk_outputs) in zip(chunks, results):
+            if isinstance(block_id, int):
+                block = block_id
+            for (index, call, data), output in zip(chunk, chunk_outputs):
+                outputs[index] = output
+                if self.cache and output is not None:
+                    # A copy, a memoryview slice would pin the whole response
+                    self.cache.set(
+                        block, call.target, data, bytes(output), self.chain_id
+                    )
+
+    def decode(self, outputs):
+        timer = Timer()
         result = {}
-        for call, output in zip(self.calls, outputs):
-            result.update(call.decode_output(output))
+        self.failed = []
+        for index, call in enumerate(self.calls):
+            output = outputs[index]
+            if failed(call, output):
+                self.failed.append(call)
+                result.update(empty(call))
+            else:
+                result.update(call.decode_output(output))
+        self.stats.decode_time += timer.lap()
+        self.stats.failed = len(self.failed)
+        return result
+
+    def aggregator(self, chain_id):
+        return resolve_aggregator(chain_id)
+
+    def fetch(self):
+        """
+        Runs the batch, returns the raw {call index: output}
+        """
+        chain_id = web3.chain_id
+        aggregator = self.aggregator(chain_id)
+        if not predates(chain_id, self.block_id):
+            try:
+                return self.run(aggregator)
+            except AggregatorMissing:
+                if not has_code(aggregator.target):
+                    # The chain went back to before the aggregator was deployed
+                    forget_aggregator(chain_id)
+                    aggregator = self.aggregator(chain_id)
+                    try:
+                        return self.run(aggregator)
+                    except AggregatorMissing:
+                        pass
+        # The pinned block predates the aggregator
+        for fallback in fallbacks(chain_id, aggregator):
+            try:
+                return self.run(fallback)
+            except AggregatorMissing:
+                continue
+
+    def run(self, aggregator):
+        if aggregator:
+            aggregate = partial(self.aggregate, aggregator)
+        else:
+            aggregate = self.batch
+
+        self.stats = BatchStats(self.stats.label)
+        block_id = self.block_id
+        timer = Timer()
+        outputs, misses = self.lookup(block_id)
+        chunks = self.chunks(misses)
+        self.stats.encode_time += timer.lap()
+        self.stats.calls = len(self.calls)
+        self.stats.cached = len(outputs)
+
+        # Without an explicit block the first chunk runs at latest and pins
+        # the block every other chunk is read at
+        results = []
+        if chunks and block_id is None:
+            results.append(aggregate(chunks[0], "latest"))
+            block_id = results[0][0]
+
+        pending = chunks[len(results) :]
+        if len(pending) == 1:
+            results.append(aggregate(pending[0], block_id))
+        elif pending:
+            with ThreadPoolExecutor(
+                max_workers=min(self.workers, len(pending))
+            ) as pool:
+                results += pool.map(lambda chunk: aggregate(chunk, block_id), pending)
+
+        self.block = results[0][0] if results else block_id
+        self.stats.block = self.block
+        self.store(outputs, chunks, results, self.block_id)
+        return outputs
+
+    def __call__(self):
+        result = self.decode(self.fetch())
+        emit(self.stats)
         return result
@@ -0,0 +1,23 @@
+from typing import List
+
+from helpers.multicall.call import Call
+
+
+class CallPlan:
+    """
+    Immutable, pre-encoded call list
+    Calldata is encoded once when the plan is built, running it again only
+    sends the same bytes and decodes the outputs
+    """
+
+    def __init__(self, calls: List[Call]):
+        self.calls = tuple(calls)
+        self.requests = tuple(
+            (index, call, call.data) for index, call in enumerate(self.calls)
+        )
+        self.keys = tuple(name for call in self.calls for name, _ in call.returns or [])
+        # Encoded aggregate calldata by (aggregator, function, call indices)
+        self.aggregates = {}
+
+    def __len__(self):
+        return len(self.calls)
@@ -1,8 +1,13 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/signature.py
+from functools import lru_cache
 
-from eth_abi import encode_single, decode_single
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_abi.grammar import parse
+from eth_abi.registry import registry
 from eth_utils import function_signature_to_4byte_selector
 
+from helpers.multicall.constants import SIGNATURE_CACHE_SIZE
+
 
 def parse_signature(signature):
     """
@@ -25,6 +30,35 @@ def parse_signature(signature):
     return parts
 
 
+def _word_decoder(abi_type):
+    """
+    Returns a decoder for a single static 32 byte word, or None if the type
+    has to go through eth_abi
+    """
+    if abi_type.arrlist:
+        return None
+    if abi_type.base == "uint":
+        return _decode_uint
+    if abi_type.base == "address":
+        return _decode_address
+    if abi_type.base == "bool":
+        return _decode_bool
+    return None
+
+
+def _decode_uint(word):
+    return int.from_bytes(word, "big")
+
+
+def _decode_address(word):
+    # Same normalized (lowercase) form eth_abi returns
+    return "0x" + bytes(word[12:]).hex()
+
+
+def _decode_bool(word):
+    return int.from_bytes(word, "big") != 0
+
+
 class Signature:
     def __init__(self, signature):
         self.signature = signature
@@ -34,12 +68,43 @@ class Signature:
         self.function = "".join(self.parts[:2])
         self.fourbyte = function_signature_to_4byte_selector(self.function)
 
+        # Compile the codecs once instead of on every encode / decode
+        self.encoder = registry.get_encoder(self.input_types)
+        self.decoder = registry.get_decoder(self.output_types)
+
+        # Outputs made only of static single word types skip eth_abi entirely
+        word_decoders = [
+            _word_decoder(component)
+            for component in parse(self.output_types).components
+        ]
+        if word_decoders and all(word_decoders):
+            self.word_decoders = word_decoders
+            self.output_size = 32 * len(word_decoders)
+        else:
+            self.word_decoders = None
+            self.output_size = None
+
     def encode_data(self, args=None):
-        return (
-            self.fourbyte + encode_single(self.input_types, args)
-            if args
-            else self.fourbyte
-        )
+        return self.fourbyte + self.encoder(args) if args else self.fourbyte
 
     def decode_data(self, output):
-        return decode_single(self.output_types, output)
+        if self.word_decoders and len(output) >= self.output_size:
+            if self.output_size == 32:
+                return (self.word_decoders[0](output[:32]),)
+            return tuple(
+                decode(output[offset : offset + 32])
+                for offset, decode in zip(
+                    range(0, self.output_size, 32), self.word_decoders
+                )
+            )
+        return self.decoder(ContextFramesBytesIO(output))
+
+
+@lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+def get_signature(signature):
+    """
+    Interned Signature for 'func(address)(uint256)'
+    Parsing and selector hashing only happen the first time a signature is seen,
+    least recently used signatures are evicted once the registry is full
+    """
+    return Signature(signature)
@@ -0,0 +1,302 @@
+import threading
+import time
+from itertools import count
+from typing import List
+
+import requests
+from brownie import web3
+from eth_utils import to_hex
+from hexbytes import HexBytes
+from requests.adapters import HTTPAdapter
+
+from helpers.multicall.constants import (
+    RPC_ENDPOINT_COOLDOWN,
+    RPC_ENDPOINT_MAX_COOLDOWN,
+    RPC_LATENCY_SMOOTHING,
+    RPC_POOL_SIZE,
+    RPC_THROTTLE_BACKOFF,
+    RPC_THROTTLE_RETRIES,
+    RPC_TIMEOUT,
+)
+from helpers.multicall.limiter import limiter
+
+
+def block_param(block_id):
+    if block_id is None:
+        return "latest"
+    if isinstance(block_id, int):
+        return hex(block_id)
+    return block_id
+
+
+def reverted(error):
+    """
+    True when an eth_call error is the call reverting, not the node failing
+    (missing state, unknown block, limits). Geth style nodes answer code 3
+    "execution reverted", ganache "VM Exception ...: revert"
+    """
+    if isinstance(error, ValueError) and error.args:
+        error = error.args[0]
+    if isinstance(error, dict):
+        if error.get("code") == 3:
+            return True
+        error = error.get("message", "")
+    return "revert" in str(error).lower()
+
+
+def result(response):
+    if "error" in response:
+        # Same as web3, RPC errors surface as ValueError
+        raise ValueError(response["error"])
+    return response["result"]
+
+
+class Transport:
+    """
+    How eth_calls reach the node: one at a time through brownie's web3, or
+    many at once as a single JSON-RPC batch when there is no aggregator
+    contract to pack them into
+    """
+
+    def __init__(self, limiter=limiter):
+        self.session = requests.Session()
+        self.ids = count()
+        self.limiter = limiter
+
+    def rpc(self, method, params):
+        return {
+            "jsonrpc": "2.0",
+            "id": next(self.ids),
+            "method": method,
+            "params": params,
+        }
+
+    def limited(self, send, *args):
+        """
+        Runs send(*args) inside the adaptive concurrency window, throttled
+        requests (HTTP 429) are backed off and retried
+        """
+        for attempt in range(RPC_THROTTLE_RETRIES + 1):
+            with self.limiter.slot() as ticket:
+                start = time.monotonic()
+                try:
+                    return_value = send(*args)
+                except requests.Timeout:
+                    self.limiter.timed_out(ticket)
+                    raise
+                except requests.HTTPError as e:
+                    throttled = e.response is not None and e.response.status_code == 429
+                    if not throttled or attempt == RPC_THROTTLE_RETRIES:
+                        raise
+                    self.limiter.throttled(ticket)
+                else:
+                    self.limiter.succeeded(time.monotonic() - start)
+                    return return_value
+            time.sleep(RPC_THROTTLE_BACKOFF * 2 ** attempt)
+
+    def call(self, tx, block_id=None):
+        return self.limited(self.send_call, tx, block_id)
+
+    def request(self, payload):
+        return self.limited(self.send_request, payload)
+
+    def send_call(self, tx, block_id):
+        return web3.eth.call(tx, block_id)
+
+    def can_batch(self):
+        # IPC / websocket providers cannot take a JSON-RPC batch
+        return str(getattr(web3.provider, "endpoint_uri", "")).startswith("http")
+
+    def send_request(self, payload):
+        endpoint = web3.provider.endpoint_uri
+        response = self.session.post(endpoint, json=payload, timeout=RPC_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def block_number(self):
+        if not self.can_batch():
+            return web3.eth.block_number
+        return int(result(self.request(self.rpc("eth_blockNumber", []))), 16)
+
+    def batch_call(self, txs: List[dict], block_id=None):
+        """
+        Sends every eth_call in one round trip, returns (block, outputs)
+        An unpinned batch is pinned to the current block number first, so
+        every call reads the same block. Calls that revert come back as None,
+        any other error raises ValueError
+        """
+        if block_id in (None, "latest"):
+            block_id = self.block_number()
+
+        if not self.can_batch():
+            return block_id, [self.try_call(tx, block_id) for tx in txs]
+
+        payload = [
+            self.rpc(
+                "eth_call",
+                [{"to": tx["to"], "data": to_hex(tx["data"])}, block_param(block_id)],
+            )
+            for tx in txs
+        ]
+        responses = self.request(payload)
+        if not isinstance(responses, list):
+            # The whole batch was refused, e.g. too large
+            raise ValueError(responses.get("error", responses))
+        responses = {response["id"]: response for response in responses}
+        outputs = []
+        for request in payload:
+            response = responses[request["id"]]
+            if "error" not in response:
+                outputs.append(HexBytes(response["result"]))
+            elif reverted(response["error"]):
+                outputs.append(None)
+            else:
+                raise ValueError(response["error"])
+        return block_id, outputs
+
+    def try_call(self, tx, block_id):
+        try:
+            return self.call(tx, block_id)
+        except ValueError as e:
+            if not reverted(e):
+                raise
+            # Same as a failed call in a Multicall3 batch
+            return None
+
+
+class Endpoint:
+    """
+    One RPC node with its own keep-alive connection pool and health record
+    """
+
+    def __init__(self, uri, pool_size=RPC_POOL_SIZE):
+        self.uri = uri
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Smoothed seconds per request, None until the first response
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.down_until = 0
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+    def latency_ms(self):
+        return None if self.latency is None else self.latency * 1000
+
+    def succeeded(self, elapsed):
+        self.requests += 1
+        self.consecutive_failures = 0
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += RPC_LATENCY_SMOOTHING * (elapsed - self.latency)
+
+    def failed(self, now):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        cooldown = RPC_ENDPOINT_COOLDOWN * 2 ** (self.consecutive_failures - 1)
+        self.down_until = now + min(cooldown, RPC_ENDPOINT_MAX_COOLDOWN)
+
+
+class PooledTransport(Transport):
+    """
+    Sends everything as raw JSON-RPC over persistent sessions to several
+    endpoints, always trying the fastest healthy one first and moving on to
+    the next one when a request times out or the node errors
+
+        set_transport(PooledTransport(["http://node-a:9650/ext/bc/C/rpc", ...]))
+    """
+
+    def __init__(
+        self, uris, timeout=RPC_TIMEOUT, pool_size=RPC_POOL_SIZE, limiter=limiter
+    ):
+        super().__init__(limiter)
+        self.endpoints = [Endpoint(uri, pool_size) for uri in uris]
+        self.timeout = timeout
+        self.lock = threading.Lock()
+
+    def ranked(self):
+        """
+        Healthy endpoints fastest first (unmeasured ones get probed first),
+        endpoints cooling down are only a last resort
+        """
+        now = time.monotonic()
+        with self.lock:
+            return sorted(
+                self.endpoints,
+                key=lambda endpoint: (
+                    not endpoint.healthy(now),
+                    endpoint.latency is not None,
+                    endpoint.latency or 0,
+                ),
+            )
+
+    def can_batch(self):
+        return True
+
+    def send_request(self, payload):
+        errors = []
+        for endpoint in self.ranked():
+            start = time.monotonic()
+            try:
+                response = endpoint.session.post(
+                    endpoint.uri, json=payload, timeout=self.timeout
+                )
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if isinstance(e, requests.Timeout):
+                    self.limiter.timed_out()
+                error = e
+            else:
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    with self.lock:
+                        endpoint.succeeded(time.monotonic() - start)
+                    return response.json()
+                error = "HTTP {}".format(response.status_code)
+            errors.append("{}: {}".format(endpoint.uri, error))
+            with self.lock:
+                endpoint.failed(time.monotonic())
+        raise requests.ConnectionError(
+            "All RPC endpoints failed: {}".format("; ".join(errors))
+        )
+
+    def call(self, tx, block_id=None):
+        payload = self.rpc(
+            "eth_call",
+            [{"to": tx["to"], "data": to_hex(tx["data"])}, block_param(block_id)],
+        )
+        return HexBytes(result(self.request(payload)))
+
+    def stats(self):
+        """
+        Per endpoint latency (ms), request and failure counts and health
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {
+                endpoint.uri: {
+                    "latency_ms": endpoint.latency_ms(),
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "healthy": endpoint.healthy(now),
+                }
+                for endpoint in self.endpoints
+            }
+
+
+transport = Transport()
+
+
+def get_transport():
+    return transport
+
+
+def set_transport(new_transport):
+    global transport
+    transport = new_transport
@@ -0,0 +1,93 @@
+"""
+Where SnapshotManager, the resolvers and approx() send their output
+
+Records are kept as (kind, render, args) and only rendered, i.e. formatted
+and written out, depending on the mode:
+
+- LIVE: straight away, as before
+- DEFERRED: records of a step() when flush() is called, e.g. at the end of
+  a simulation, the rest straight away
+- FAILURES: only for a step() that raised, dropped otherwise
+- QUIET: never, nothing is recorded or formatted
+
+Only records added inside a step() are buffered
+
+    set_reporter(Reporter(FAILURES))
+    for i in range(10000):
+        snap.settDeposit(amount, {"from": user})
+"""
+from contextlib import contextmanager
+
+from rich.console import Console
+
+console = Console()
+
+LIVE = "live"
+DEFERRED = "deferred"
+FAILURES = "failures"
+QUIET = "quiet"
+
+
+class Reporter:
+    def __init__(self, mode=LIVE):
+        self.mode = mode
+        self.records = []
+        # Nesting depth of step(), records are only buffered inside one
+        self.steps = 0
+
+    @property
+    def enabled(self):
+        """
+        False when output is thrown away, callers can skip building it
+        """
+        return self.mode != QUIET
+
+    def add(self, kind, render, *args):
+        if self.mode == QUIET:
+            return
+        if self.mode == LIVE or (self.mode == DEFERRED and not self.steps):
+            render(*args)
+        elif self.steps:
+            self.records.append((kind, render, args))
+        # FAILURES outside a step: nothing can fail, dropped
+
+    def print(self, *args):
+        self.add("text", console.print, *args)
+
+    def flush(self):
+        records, self.records = self.records, []
+        for _, render, args in records:
+            render(*args)
+
+    def discard(self):
+        self.records = []
+
+    @contextmanager
+    def step(self):
+        """
+        Scope of one checked action: with FAILURES its records are rendered
+        if it raises and dropped if it does not
+        """
+        start = len(self.records)
+        self.steps += 1
+        try:
+            yield self
+        except BaseException:
+            self.flush()
+            raise
+        finally:
+            self.steps -= 1
+        if self.mode == FAILURES:
+            del self.records[start:]
+
+
+reporter = Reporter()
+
+
+def get_reporter():
+    return reporter
+
+
+def set_reporter(new_reporter):
+    global reporter
+    reporter = new_reporter
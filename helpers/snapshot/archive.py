@@ -0,0 +1,245 @@
+"""
+Append-only SQLite archive of snaps, for analysing past runs without a fork
+
+Values are stored key-major (one clustered run of rows per key), so reading
+a key's history touches only that key's pages, which SQLite serves from a
+memory map:
+
+    archive = SnapArchive("snaps.db")
+    seqs, blocks, ppfs = archive.column("sett.pricePerFullShare")
+"""
+import json
+import sqlite3
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from helpers.snapshot.schema import get_schema
+from helpers.snapshot.snap import Snap
+
+ARCHIVE_MMAP_SIZE = 1024 * 1024 * 1024
+INT64_MIN = -(2 ** 63)
+INT64_MAX = 2 ** 63 - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snaps (
+    seq INTEGER PRIMARY KEY,
+    run INTEGER,
+    run_seq INTEGER,
+    block INTEGER,
+    entity_keys TEXT
+);
+CREATE INDEX IF NOT EXISTS snaps_block ON snaps (block);
+CREATE TABLE IF NOT EXISTS keys (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE
+);
+CREATE TABLE IF NOT EXISTS vals (
+    key_id INTEGER,
+    seq INTEGER,
+    value,
+    PRIMARY KEY (key_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+# Marker byte of every blob, so only values that were big ints decode as ints
+BLOB_BYTES = b"\x00"
+BLOB_INT = b"\x01"
+BLOB_BOOL = b"\x02"
+BLOB_ARRAY = b"\x03"
+
+
+def encode_element(value):
+    """
+    JSON form of an array element, bytes and nested arrays tagged
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"bytes": bytes(value).hex()}
+    if isinstance(value, (tuple, list)):
+        return {"array": [encode_element(element) for element in value]}
+    raise TypeError("Cannot archive a {} value".format(type(value).__name__))
+
+
+def decode_element(value):
+    if isinstance(value, dict):
+        if "bytes" in value:
+            return bytes.fromhex(value["bytes"])
+        return tuple(decode_element(element) for element in value["array"])
+    return value
+
+
+def encode_value(value):
+    """
+    SQLite value of a snap value: NULL, 64 bit ints, floats and text as they
+    are, everything else as a blob behind a marker byte. uint256 balances go
+    in as signed big endian, arrays (e.g. address[] outputs) as JSON
+    """
+    if value is None or isinstance(value, (float, str)):
+        return value
+    if isinstance(value, bool):
+        return BLOB_BOOL + bytes([value])
+    if isinstance(value, int):
+        if INT64_MIN <= value <= INT64_MAX:
+            return value
+        length = (value.bit_length() + 8) // 8
+        return BLOB_INT + value.to_bytes(length, "big", signed=True)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return BLOB_BYTES + bytes(value)
+    if isinstance(value, (tuple, list)):
+        return BLOB_ARRAY + json.dumps(encode_element(value)["array"]).encode()
+    raise TypeError("Cannot archive a {} value".format(type(value).__name__))
+
+
+def decode_value(value):
+    if not isinstance(value, bytes):
+        return value
+    marker, payload = value[:1], value[1:]
+    if marker == BLOB_INT:
+        return int.from_bytes(payload, "big", signed=True)
+    if marker == BLOB_BOOL:
+        return payload == b"\x01"
+    if marker == BLOB_ARRAY:
+        return decode_element({"array": json.loads(payload)})
+    return payload
+
+
+def as_array(values):
+    """
+    numpy array when numpy is installed: int64 if every value fits, else
+    object. Plain list otherwise
+    """
+    if numpy is None:
+        return values
+    if all(
+        isinstance(value, int) and INT64_MIN <= value <= INT64_MAX for value in values
+    ):
+        return numpy.array(values, dtype=numpy.int64)
+    return numpy.array(values, dtype=object)
+
+
+class SnapArchive:
+    def __init__(self, path, mmap_size=ARCHIVE_MMAP_SIZE):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA mmap_size = {}".format(int(mmap_size)))
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.key_ids = {
+            key: key_id for key_id, key in self.db.execute("SELECT id, key FROM keys")
+        }
+        # Every process appending to the archive is a run of its own
+        self.run = self.db.execute("SELECT COALESCE(MAX(run), 0) + 1 FROM snaps")
+        self.run = self.run.fetchone()[0]
+
+    # ===== Writing =====
+
+    def write(self, snap: Snap):
+        """
+        Appends one snap, returns its archive sequence id
+        The snap's own (history) sequence id is kept as run_seq
+        """
+        # Encoded up front, a value that cannot be stored fails before writing
+        values = [(key, encode_value(value)) for key, value in snap.data.items()]
+        with self.lock:
+            new_ids = {}
+            with self.db:
+                cursor = self.db.execute(
+                    "INSERT INTO snaps (run, run_seq, block, entity_keys)"
+                    " VALUES (?, ?, ?, ?)",
+                    (self.run, snap.seq, snap.block, json.dumps(snap.entityKeys)),
+                )
+                seq = cursor.lastrowid
+                rows = []
+                for key, value in values:
+                    key_id = self.key_ids.get(key) or new_ids.get(key)
+                    if key_id is None:
+                        key_id = self.db.execute(
+                            "INSERT INTO keys (key) VALUES (?)", (key,)
+                        ).lastrowid
+                        new_ids[key] = key_id
+                    rows.append((key_id, seq, value))
+                self.db.executemany(
+                    "INSERT INTO vals (key_id, seq, value) VALUES (?, ?, ?)", rows
+                )
+            # Only once committed, a rolled back key is not in the archive
+            self.key_ids.update(new_ids)
+        return seq
+
+    # ===== Reading =====
+
+    def keys(self, prefix=""):
+        return [key for key in self.key_ids if key.startswith(prefix)]
+
+    def column(self, key, start=None, end=None):
+        """
+        (seqs, blocks, values) of one key across every archived snap, between
+        blocks start and end inclusive if given
+        """
+        query = (
+            "SELECT vals.seq, snaps.block, vals.value FROM vals"
+            " JOIN snaps ON snaps.seq = vals.seq WHERE vals.key_id = ?"
+        )
+        params = [self.key_ids.get(key)]
+        if start is not None:
+            query += " AND snaps.block >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND snaps.block <= ?"
+            params.append(end)
+        with self.lock:
+            rows = self.db.execute(query + " ORDER BY vals.seq", params).fetchall()
+        seqs = [row[0] for row in rows]
+        blocks = [row[1] for row in rows]
+        values = [decode_value(row[2]) for row in rows]
+        return as_array(seqs), as_array(blocks), as_array(values)
+
+    def frame(self, keys, start=None, end=None):
+        """
+        pandas DataFrame of the keys indexed by sequence id, pandas required
+        """
+        import pandas
+
+        columns = {}
+        blocks = {}
+        for key in keys:
+            seqs, key_blocks, values = self.column(key, start, end)
+            columns[key] = pandas.Series(list(values), index=list(seqs), dtype=object)
+            blocks.update(zip(list(seqs), list(key_blocks)))
+        frame = pandas.DataFrame(columns)
+        frame.insert(0, "block", pandas.Series(blocks))
+        return frame
+
+    def snap(self, seq):
+        """
+        One archived snap rebuilt in full
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT block, entity_keys FROM snaps WHERE seq = ?", (seq,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(seq)
+            rows = self.db.execute(
+                "SELECT keys.key, vals.value FROM vals"
+                " JOIN keys ON keys.id = vals.key_id WHERE vals.seq = ?"
+                " ORDER BY vals.key_id",
+                (seq,),
+            ).fetchall()
+        data = {key: decode_value(value) for key, value in rows}
+        snap = Snap(data, row[0], json.loads(row[1]), get_schema(tuple(data)))
+        snap.seq = seq
+        return snap
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM snaps").fetchone()[0]
+
+    def close(self):
+        self.db.close()
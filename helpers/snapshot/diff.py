@@ -0,0 +1,92 @@
+from tabulate import tabulate
+
+from helpers.snapshot.snap import MISSING, Snap
+
+
+def delta(a, b):
+    if type(a) is int and type(b) is int:
+        return b - a
+    else:
+        return "-"
+
+
+class SnapDiff:
+    """
+    The keys that changed between two snaps, with both values
+    Nothing is formatted until a report is asked for. Only the blocks of the
+    snaps are kept, a buffered report does not hold on to whole snaps
+    """
+
+    __slots__ = ("before_block", "after_block", "keys", "old", "new")
+
+    def __init__(self, before_block, after_block, keys, old, new):
+        self.before_block = before_block
+        self.after_block = after_block
+        self.keys = keys
+        self.old = old
+        self.new = new
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def changes(self):
+        """
+        {key: (before, after)} of every changed key
+        """
+        return {key: (a, b) for key, a, b in zip(self.keys, self.old, self.new)}
+
+    def deltas(self):
+        return {key: delta(a, b) for key, a, b in zip(self.keys, self.old, self.new)}
+
+    def rows(self, format=None):
+        format = format or (lambda key, value: value)
+        return [
+            [key, format(key, a), format(key, b), format(key, delta(a, b))]
+            for key, a, b in zip(self.keys, self.old, self.new)
+        ]
+
+    def render(self, format=None):
+        return tabulate(
+            self.rows(format),
+            headers=["metric", "before", "after", "diff"],
+            tablefmt="grid",
+        )
+
+
+def diff_snaps(before: Snap, after: Snap) -> SnapDiff:
+    """
+    Compares the snaps column by column, keys the before snap does not hold
+    are left out and ones only the after snap lacks are read through get()
+    """
+    schema = before.schema
+    old = before.values
+    if after.schema is schema:
+        new = after.values
+    else:
+        columns = [after.schema.column(key) for key in schema.keys]
+        new = [after.value(column) for column in columns]
+
+    keys, olds, news = [], [], []
+    for column, (a, b) in enumerate(zip(old, new)):
+        if a == b or a is MISSING:
+            continue
+        key = schema.keys[column]
+        if b is MISSING:
+            b = after.get(key)
+            if a == b:
+                continue
+        keys.append(key)
+        olds.append(a)
+        news.append(b)
+    return SnapDiff(before.block, after.block, keys, olds, news)
+
+
+def diff_sequence(snaps):
+    """
+    Diffs of every snap against the one before it
+    """
+    snaps = list(snaps)
+    return [diff_snaps(a, b) for a, b in zip(snaps, snaps[1:])]
@@ -0,0 +1,142 @@
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from helpers.snapshot.lazy import LazySnap
+from helpers.snapshot.schema import get_schema
+from helpers.snapshot.snap import Snap
+
+SNAP_HISTORY_WINDOW = 256
+SNAP_HISTORY_BYTES = 64 * 1024 * 1024
+
+
+def snap_size(snap):
+    """
+    Rough bytes held by a snap, the schema is shared and not counted
+    """
+    return sys.getsizeof(snap.values) + sum(
+        sys.getsizeof(value) for value in snap.values
+    )
+
+
+class SnapHistory:
+    """
+    Every snap taken, by sequence id in the order they were added
+    The latest `window` snaps (and at most `max_bytes` of them) stay in
+    memory, older ones are appended to a file and read back on access.
+    A spilled LazySnap comes back lazy, still able to fetch keys at its block
+    """
+
+    def __init__(
+        self, window=SNAP_HISTORY_WINDOW, max_bytes=SNAP_HISTORY_BYTES, path=None
+    ):
+        self.window = window
+        self.max_bytes = max_bytes
+        # Without a path the file is anonymous and goes away with the process
+        self.path = path
+        if path is None:
+            self.file = tempfile.TemporaryFile(prefix="snaps-")
+        else:
+            self.file = open(path, "ab+")
+        self.lock = threading.Lock()
+        self.next_seq = 0
+        # seq -> (snap, size) of the snaps in memory, oldest first
+        self.memory = OrderedDict()
+        self.bytes = 0
+        # seq -> (offset, length) of the spilled snaps
+        self.offsets = {}
+        # seq -> (calls, used, label) of spilled LazySnaps, references to
+        # what the manager shares between snaps, to rebuild them on load
+        self.lazy = {}
+        # block -> seqs of every snap taken at it
+        self.blocks = {}
+
+    def add(self, snap):
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            snap.seq = seq
+            size = snap_size(snap)
+            self.memory[seq] = (snap, size)
+            self.bytes += size
+            self.blocks.setdefault(snap.block, []).append(seq)
+            while len(self.memory) > 1 and (
+                len(self.memory) > self.window or self.bytes > self.max_bytes
+            ):
+                self.spill()
+        return seq
+
+    def spill(self):
+        seq, (snap, size) = self.memory.popitem(last=False)
+        self.bytes -= size
+        record = pickle.dumps(
+            (seq, snap.block, snap.entityKeys, snap.schema.keys, dict(snap.data)),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        self.file.seek(0, os.SEEK_END)
+        self.offsets[seq] = (self.file.tell(), len(record))
+        self.file.write(record)
+        if isinstance(snap, LazySnap):
+            self.lazy[seq] = (snap.calls, snap.used, snap.label)
+
+    def load(self, seq):
+        offset, length = self.offsets[seq]
+        self.file.flush()
+        self.file.seek(offset)
+        seq, block, entityKeys, keys, data = pickle.loads(self.file.read(length))
+        if seq in self.lazy:
+            calls, used, label = self.lazy[seq]
+            snap = LazySnap(
+                data, block, entityKeys, calls, used, label, get_schema(keys)
+            )
+        else:
+            snap = Snap(data, block, entityKeys, get_schema(keys))
+        snap.seq = seq
+        return snap
+
+    def __getitem__(self, seq):
+        with self.lock:
+            if seq in self.memory:
+                return self.memory[seq][0]
+            if seq in self.offsets:
+                return self.load(seq)
+        raise KeyError(seq)
+
+    def __len__(self):
+        return self.next_seq
+
+    def __contains__(self, seq):
+        return seq in self.memory or seq in self.offsets
+
+    def at(self, block):
+        """
+        Every snap taken at the block, in the order they were taken
+        """
+        return [self[seq] for seq in self.blocks.get(block, [])]
+
+    def latest(self, block=None):
+        """
+        The last snap taken at the block, or at all
+        """
+        if block is None:
+            return self[self.next_seq - 1]
+        seqs = self.blocks.get(block)
+        if not seqs:
+            raise KeyError(block)
+        return self[seqs[-1]]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "snaps": self.next_seq,
+                "in_memory": len(self.memory),
+                "memory_bytes": self.bytes,
+                "spilled": len(self.offsets),
+                "file_bytes": self.file.seek(0, os.SEEK_END),
+            }
+
+    def close(self):
+        self.file.close()
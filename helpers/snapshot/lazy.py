@@ -0,0 +1,51 @@
+from helpers.multicall import Multicall
+from helpers.snapshot.snap import Snap
+
+
+class LazySnap(Snap):
+    """
+    Snap holding only the keys fetched so far
+    Every key read through the getters is added to `used`, which the manager
+    shares between snaps to schedule only those calls next time. A key that
+    was not fetched is read at the snap's block on first access, together
+    with every other used key still missing
+    """
+
+    __slots__ = ("calls", "used", "label")
+
+    def __init__(self, data, block, entityKeys, calls, used, label=None, schema=None):
+        super().__init__(data, block, entityKeys, schema)
+        # key -> Call returning it, for every key a full snap would have
+        self.calls = calls
+        self.used = used
+        self.label = label
+
+    def fetch(self, keys):
+        calls = []
+        for key in keys:
+            call = self.calls.get(key)
+            if call is not None and key not in self.data and call not in calls:
+                calls.append(call)
+        if calls:
+            self.data.update(Multicall(calls, block_id=self.block, label=self.label)())
+
+    def load(self, key):
+        self.used.add(key)
+        if key not in self.data:
+            self.fetch(
+                [key] + [used for used in list(self.used) if used not in self.data]
+            )
+
+    # ===== Getters =====
+
+    def balances(self, tokenKey, accountKey):
+        self.load("balances." + tokenKey + "." + accountKey)
+        return super().balances(tokenKey, accountKey)
+
+    def shares(self, tokenKey, accountKey):
+        self.load("shares." + tokenKey + "." + accountKey)
+        return super().shares(tokenKey, accountKey)
+
+    def get(self, key):
+        self.load(key)
+        return super().get(key)
@@ -0,0 +1,50 @@
+import sys
+from functools import lru_cache
+
+SCHEMA_CACHE_SIZE = 256
+
+
+class KeySchema:
+    """
+    Column layout shared by every snap with the same keys
+    Keys are interned and indexed by every dotted prefix, so prefix queries
+    and balances / shares lookups never scan or build key strings
+    """
+
+    __slots__ = ("keys", "columns", "prefixes", "nested")
+
+    def __init__(self, keys):
+        self.keys = tuple(sys.intern(key) for key in dict.fromkeys(keys))
+        self.columns = {key: column for column, key in enumerate(self.keys)}
+        # "balances.want" -> columns of every balances.want.* key
+        self.prefixes = {}
+        # "balances" -> "want" -> "sett" -> column of balances.want.sett
+        self.nested = {}
+        for column, key in enumerate(self.keys):
+            parts = key.split(".")
+            for end in range(1, len(parts)):
+                prefix = ".".join(parts[:end])
+                self.prefixes.setdefault(prefix, []).append(column)
+            if len(parts) == 3:
+                kind, token, account = parts
+                self.nested.setdefault(kind, {}).setdefault(token, {})[account] = column
+
+    def __len__(self):
+        return len(self.keys)
+
+    def column(self, key):
+        return self.columns.get(key)
+
+    def lookup(self, kind, tokenKey, accountKey):
+        return self.nested.get(kind, {}).get(tokenKey, {}).get(accountKey)
+
+    def prefix(self, prefix):
+        return self.prefixes.get(prefix.rstrip("."), [])
+
+    def extend(self, keys):
+        return get_schema(self.keys + tuple(keys))
+
+
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def get_schema(keys):
+    return KeySchema(keys)
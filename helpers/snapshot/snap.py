@@ -1,23 +1,116 @@
+from collections.abc import MutableMapping
+
+from helpers.snapshot.schema import get_schema
+
+# Value of a schema key the snap holds nothing for (yet)
+MISSING = object()
+
+
+class SnapData(MutableMapping):
+    """
+    Dict view over a snap's values, keys not held by the snap are left out
+    """
+
+    __slots__ = ("snap",)
+
+    def __init__(self, snap):
+        self.snap = snap
+
+    def __getitem__(self, key):
+        column = self.snap.schema.column(key)
+        value = MISSING if column is None else self.snap.values[column]
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.snap.set(key, value)
+
+    def __delitem__(self, key):
+        column = self.snap.schema.column(key)
+        if column is None or self.snap.values[column] is MISSING:
+            raise KeyError(key)
+        self.snap.values[column] = MISSING
+
+    def __iter__(self):
+        values = self.snap.values
+        return (
+            key
+            for column, key in enumerate(self.snap.schema.keys)
+            if values[column] is not MISSING
+        )
+
+    def __len__(self):
+        return sum(1 for value in self.snap.values if value is not MISSING)
+
+    def __contains__(self, key):
+        column = self.snap.schema.column(key)
+        return column is not None and self.snap.values[column] is not MISSING
+
+
 class Snap:
-    def __init__(self, data, block, entityKeys):
-        self.data = data
+    """
+    Values of one snapshot, laid out by a KeySchema shared between snaps
+    """
+
+    __slots__ = ("schema", "values", "block", "entityKeys", "seq")
+
+    def __init__(self, data, block, entityKeys, schema=None):
+        self.schema = schema or get_schema(tuple(data))
+        if any(key not in self.schema.columns for key in data):
+            self.schema = self.schema.extend(data)
+        self.values = [data.get(key, MISSING) for key in self.schema.keys]
         self.block = block
         self.entityKeys = entityKeys
+        # Position in the manager's SnapHistory, blocks can repeat
+        self.seq = None
+
+    @property
+    def data(self):
+        return SnapData(self)
+
+    def value(self, column):
+        if column is None or self.values[column] is MISSING:
+            return MISSING
+        return self.values[column]
 
     # ===== Getters =====
 
     def balances(self, tokenKey, accountKey):
-        return self.data["balances." + tokenKey + "." + accountKey]
+        value = self.value(self.schema.lookup("balances", tokenKey, accountKey))
+        if value is MISSING:
+            raise KeyError("balances." + tokenKey + "." + accountKey)
+        return value
 
     def shares(self, tokenKey, accountKey):
-        return self.data["shares." + tokenKey + "." + accountKey]
+        value = self.value(self.schema.lookup("shares", tokenKey, accountKey))
+        if value is MISSING:
+            raise KeyError("shares." + tokenKey + "." + accountKey)
+        return value
 
     def get(self, key):
-        if key not in self.data.keys():
+        value = self.value(self.schema.column(key))
+        if value is MISSING:
             raise Exception("Key {} not found in snap data".format(key))
-        return self.data[key]
+        return value
+
+    def prefix(self, prefix):
+        """
+        {key: value} of every key under a dotted prefix, e.g. "balances.want"
+        """
+        keys = self.schema.keys
+        return {
+            keys[column]: self.values[column]
+            for column in self.schema.prefix(prefix)
+            if self.values[column] is not MISSING
+        }
 
     # ===== Setters =====
 
     def set(self, key, value):
-        self.data[key] = value
+        column = self.schema.column(key)
+        if column is None:
+            self.schema = self.schema.extend([key])
+            self.values.append(MISSING)
+            column = self.schema.column(key)
+        self.values[column] = value
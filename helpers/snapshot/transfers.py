@@ -0,0 +1,62 @@
+"""
+Derives ERC20 balance keys of an "after" snap from the Transfer logs of a
+receipt, so only the remaining getters need to be read again
+"""
+from hexbytes import HexBytes
+
+from helpers.multicall import CallPlan, as_wei, func
+
+TRANSFER_TOPIC = HexBytes(
+    "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+)
+
+
+def topic_address(topic):
+    return "0x" + bytes(HexBytes(topic)[-20:]).hex()
+
+
+def is_balance_call(call):
+    """
+    Plain balanceOf(holder) read whose value lands in a balances.* key as is
+    """
+    if call.function != func.erc20.balanceOf or len(call.returns or []) != 1:
+        return False
+    key, handler = call.returns[0]
+    return key.startswith("balances.") and handler in (None, as_wei)
+
+
+class TransferPlan:
+    """
+    A snap plan split into the balance keys Transfer logs account for,
+    indexed by (token, holder), and the plan of every other call
+    """
+
+    def __init__(self, plan: CallPlan):
+        self.balances = {}
+        rest = []
+        for call in plan.calls:
+            if is_balance_call(call):
+                holder = call.args[0].lower()
+                key = (call.target.lower(), holder)
+                self.balances.setdefault(key, []).append(call.returns[0][0])
+            else:
+                rest.append(call)
+        self.rest = CallPlan(rest)
+
+    def apply(self, data, logs):
+        """
+        Copy of the before data with every tracked Transfer in logs applied
+        """
+        data = dict(data)
+        for log in logs:
+            topics = log["topics"]
+            if len(topics) != 3 or HexBytes(topics[0]) != TRANSFER_TOPIC:
+                continue
+            token = log["address"].lower()
+            value = int.from_bytes(HexBytes(log["data"]), "big")
+            for holder, sign in [(topics[1], -1), (topics[2], 1)]:
+                for key in self.balances.get((token, topic_address(holder)), []):
+                    # Balances that failed to read stay unknown
+                    if data.get(key) is not None:
+                        data[key] += sign * value
+        return data
@@ -1,6 +1,13 @@
+from functools import lru_cache
+
+from brownie import interface
+
+from helpers.reporting import get_reporter
+
+
 # Assert approximate integer
 def approx(actual, expected, percentage_threshold):
-    print(actual, expected, percentage_threshold)
+    get_reporter().add("approx", print, actual, expected, percentage_threshold)
     diff = int(abs(actual - expected))
     # 0 diff should automtically be a match
     if diff == 0:
@@ -8,11 +15,35 @@ def approx(actual, expected, percentage_threshold):
     return diff < (actual * percentage_threshold // 100)
 
 
+@lru_cache(maxsize=None)
+def token_decimals(token):
+    """
+    decimals() of a token, read once per token
+    """
+    return interface.IERC20(token).decimals()
+
+
+def format_units(amount, decimals=18, places=18):
+    """
+    Fixed point amount / 10 ** decimals with integer arithmetic only,
+    at least `places` fractional digits and thousands separators
+    """
+    sign = "-" if amount < 0 else ""
+    whole, fraction = divmod(abs(amount), 10 ** decimals)
+    digits = "{:0{}d}".format(fraction, decimals) if decimals else ""
+    digits = digits.ljust(places, "0")
+    if not digits:
+        return "{}{:,}".format(sign, whole)
+    return "{}{:,}.{}".format(sign, whole, digits)
+
+
 def val(amount=0, decimals=18, token=None):
     # return amount
     # return "{:,.0f}".format(amount)
     # If no token specified, use decimals
     if token:
-        decimals = interface.IERC20(token).decimals()
+        decimals = token_decimals(token)
 
-    return "{:,.18f}".format(amount / 10 ** decimals)
+    if not isinstance(amount, int):
+        return "{:,.18f}".format(amount / 10 ** decimals)
+    return format_units(amount, decimals)
@@ -0,0 +1,140 @@
+import time
+import tracemalloc
+
+from eth_abi import decode_single, encode_single
+from eth_utils import to_checksum_address
+
+from helpers.multicall import Call, Signature, as_wei, func
+from helpers.multicall.envelope import decode_aggregate
+
+from rich.console import Console
+
+console = Console()
+
+TOKENS = [
+    "0xe28984e1ee8d431346d32bec9ec800efb643eef4",
+    "0x60781c2586d68229fde47564546784ab3faca982",
+    "0xb31f66aa3c1e785363f0875a1b74e27b85fd66c7",
+    "0xc7198437980c041c805a1edcba50c1ce5db95118",
+]
+ENTITIES = [
+    "0xccee4a893d5d97829008af8bee5b7169176bee5a",
+    "0xb88cadd880356e7dab0642651308e95791177ac7",
+    "0x324fc42795c513ded0376f777e5bf71129e268e7",
+    "0xb723f5f8874de10f872b0a7fc27b685524222a34",
+    "0x8eecd09e9936cf983971b9f466d8d9efea02591d",
+    "0x3323cda0d182b5d5165ba24580f1984af861beec",
+]
+
+ROUNDS = 200
+SNAPSHOT_CALLS = 200
+ENVELOPE_CALLS = [1000, 5000]
+
+
+def build_uncached():
+    """
+    What Call.__init__ used to cost: a fresh checksum and Signature per call
+    """
+    for token in TOKENS:
+        for entity in ENTITIES:
+            to_checksum_address(token)
+            Signature(func.erc20.balanceOf)
+
+
+def build_cached():
+    for token in TOKENS:
+        for entity in ENTITIES:
+            Call(
+                token,
+                [func.erc20.balanceOf, entity],
+                [["balances." + token + "." + entity, as_wei]],
+            )
+
+
+def calls_per_second(build):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        build()
+    elapsed = time.perf_counter() - start
+    return ROUNDS * len(TOKENS) * len(ENTITIES) / elapsed
+
+
+def decode_snapshot(decode):
+    output = encode_single("(uint256)", (10 ** 18,))
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for _ in range(SNAPSHOT_CALLS):
+            decode(output)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def decode_envelope(unpack, output, signature):
+    """
+    Returns (seconds, peak bytes allocated) to unpack an aggregate return
+    and decode every call in it
+    """
+
+    def run():
+        _, outputs = unpack(output)
+        for call_output in outputs:
+            signature.decode_data(call_output)
+
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    """
+    Measures how many snapshot balance calls can be built per second,
+    with and without the interned signature / checksum registries,
+    and how long decoding a snapshot's worth of outputs and large aggregate
+    envelopes takes
+    """
+    before = calls_per_second(build_uncached)
+    after = calls_per_second(build_cached)
+
+    console.print("[blue]=== Call construction ===[/blue]")
+    console.print("uncached: {:,.0f} calls/s".format(before))
+    console.print("interned: {:,.0f} calls/s".format(after))
+    console.print("speedup:  {:.1f}x".format(after / before))
+
+    signature = Signature(func.erc20.balanceOf)
+    before = decode_snapshot(lambda output: decode_single("(uint256)", output))
+    after = decode_snapshot(signature.decode_data)
+
+    console.print(
+        "[blue]=== Decoding a {} call snapshot ===[/blue]".format(SNAPSHOT_CALLS)
+    )
+    console.print("decode_single: {:.3f} ms".format(before * 1000))
+    console.print("precompiled:   {:.3f} ms".format(after * 1000))
+
+    console.print("[blue]=== Aggregate envelope ===[/blue]")
+    # Single word balances, and 10 address arrays (getProtectedTokens)
+    tokens = [TOKENS[0]] * 10
+    returns = [
+        (signature, encode_single("(uint256)", (10 ** 18,))),
+        (
+            Signature(func.strategy.getProtectedTokens),
+            encode_single("(address[])", (tokens,)),
+        ),
+    ]
+    for call_signature, call_output in returns:
+        for calls in ENVELOPE_CALLS:
+            output = encode_single("(uint256,bytes[])", (1, [call_output] * calls))
+            for name, unpack in [
+                ("eth_abi", lambda output: decode_single("(uint256,bytes[])", output)),
+                ("memoryview", decode_aggregate),
+            ]:
+                elapsed, peak = decode_envelope(unpack, output, call_signature)
+                console.print(
+                    "{} x {} bytes, {}: {:.3f} ms, {:,} bytes peak".format(
+                        calls, len(call_output), name, elapsed * 1000, peak
+                    )
+                )
@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from config.StrategyResolver import StrategyResolver
+from helpers.reporting import DEFERRED, FAILURES, LIVE, QUIET, Reporter, set_reporter
+from helpers.snapshot.snap import Snap
+from helpers.SnapshotManager import SnapshotManager
+
+from rich.console import Console
+
+console = Console()
+
+STEPS = 1000
+ENTITIES = 50
+TOKENS = ["want", "sett", "token1", "token2", "png"]
+
+
+@contextmanager
+def devnull_stdout():
+    """
+    Points fd 1 at /dev/null, so writes still happen but cost no terminal
+    time. A real terminal is slower, these numbers are a lower bound
+    """
+    sys.stdout.flush()
+    saved = os.dup(1)
+    null = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(null, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(null)
+        os.close(saved)
+
+
+def deposit_snaps(step, amount=10 ** 18):
+    """
+    Before / after snaps of a deposit that passes confirm_deposit, with every
+    other entity balance moving too so each compare has a full table
+    """
+    before = {
+        "sett.totalSupply": 10 ** 24,
+        "sett.pricePerFullShare": 10 ** 18,
+        "balances.want.sett": 10 ** 22,
+        "balances.want.user": 10 ** 22,
+        "balances.sett.user": 10 ** 20,
+    }
+    for token in TOKENS:
+        for entity in range(ENTITIES):
+            key = "balances.{}.entity{}".format(token, entity)
+            before[key] = 10 ** 21 + step * entity
+    after = {key: value + 1 for key, value in before.items()}
+    after["sett.totalSupply"] = before["sett.totalSupply"] + amount
+    after["sett.pricePerFullShare"] = before["sett.pricePerFullShare"]
+    after["balances.want.sett"] = before["balances.want.sett"] + amount
+    after["balances.want.user"] = before["balances.want.user"] - amount
+    after["balances.sett.user"] = before["balances.sett.user"] + amount
+    return Snap(before, step, []), Snap(after, step + 1, [])
+
+
+def throughput(resolver, steps, mode):
+    """
+    Confirmed deposits per second, output included
+    """
+    reporter = Reporter(mode)
+    set_reporter(reporter)
+    amount = 10 ** 18
+    try:
+        with devnull_stdout():
+            start = time.perf_counter()
+            for step in range(STEPS):
+                before, after = steps[step]
+                with reporter.step():
+                    resolver.confirm_deposit(
+                        before, after, {"user": "user", "amount": amount}
+                    )
+            reporter.flush()
+            elapsed = time.perf_counter() - start
+    finally:
+        set_reporter(Reporter())
+    return STEPS / elapsed
+
+
+def main():
+    """
+    Step throughput of confirm_deposit (compare table, approx assertions)
+    with each reporting mode
+    """
+    manager = SnapshotManager.__new__(SnapshotManager)
+    manager.key = "Benchmark"
+    manager.decimals = {}
+    resolver = StrategyResolver(manager)
+    steps = [deposit_snaps(step) for step in range(STEPS)]
+
+    console.print(
+        "[blue]=== confirm_deposit steps/s, {} keys per snap ===[/blue]".format(
+            len(steps[0][0].schema)
+        )
+    )
+    for mode in [LIVE, DEFERRED, FAILURES, QUIET]:
+        console.print("{}: {:.0f}".format(mode, throughput(resolver, steps, mode)))
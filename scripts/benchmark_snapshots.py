@@ -0,0 +1,111 @@
+import time
+
+from dotmap import DotMap
+from eth_abi import decode_single, encode_single
+from eth_utils import function_signature_to_4byte_selector
+
+from helpers.multicall import CallPlan, Multicall, call_cache
+from helpers.multicall.aggregator import AGGREGATE_FUNCTION
+from helpers.multicall.transport import Transport, get_transport, set_transport
+from helpers.StrategyCoreResolver import StrategyCoreResolver
+
+from rich.console import Console
+
+console = Console()
+
+ROUNDS = 200
+ENTITIES = 50
+
+AGGREGATE_SELECTOR = function_signature_to_4byte_selector(AGGREGATE_FUNCTION)
+
+plans = {}
+
+
+def address(index):
+    return "0x{:040x}".format(index + 1)
+
+
+class CannedTransport(Transport):
+    """
+    Answers every aggregate with a word per call, and keeps track of the time
+    spent doing so to take it out of the measurement
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.elapsed = 0
+
+    def call(self, tx, block_id=None):
+        start = time.perf_counter()
+        data = bytes(tx["data"])
+        word = encode_single("uint256", 10 ** 18)
+        if data[:4] == AGGREGATE_SELECTOR:
+            (calls,) = decode_single("((address,bytes)[])", data[4:])
+            output = encode_single("(uint256,bytes[])", (1, [word] * len(calls)))
+        else:
+            _, calls = decode_single("(bool,(address,bytes)[])", data[4:])
+            output = encode_single(
+                "(uint256,bytes32,(bool,bytes)[])",
+                (1, b"\0" * 32, [(True, word)] * len(calls)),
+            )
+        self.elapsed += time.perf_counter() - start
+        return output
+
+
+def snap_overhead(resolver, entities, snap):
+    transport = CannedTransport()
+    previous = get_transport()
+    set_transport(transport)
+    try:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            call_cache.clear()
+            snap(resolver, entities)
+        total = time.perf_counter() - start
+    finally:
+        set_transport(previous)
+    return (total - transport.elapsed) / ROUNDS
+
+
+def add_snap_calls(resolver, entities):
+    calls = []
+    calls = resolver.add_balances_snap(calls, entities)
+    calls = resolver.add_sett_snap(calls)
+    calls = resolver.add_strategy_snap(calls, entities=entities)
+    return calls
+
+
+def snap_rebuilt(resolver, entities):
+    Multicall(add_snap_calls(resolver, entities))()
+
+
+def snap_planned(resolver, entities):
+    key = tuple(entities.items())
+    if key not in plans:
+        plans[key] = CallPlan(add_snap_calls(resolver, entities))
+    Multicall(plans[key])()
+
+
+def main():
+    """
+    Per snap overhead of building, encoding and decoding the snapshot calls,
+    with the RPC itself taken out, rebuilding every snap vs a compiled plan
+    """
+    manager = DotMap(
+        want=DotMap(address=address(1000)),
+        sett=DotMap(address=address(1001)),
+        strategy=DotMap(address=address(1002)),
+    )
+    resolver = StrategyCoreResolver(manager)
+    entities = {"entity{}".format(i): address(i) for i in range(ENTITIES)}
+
+    before = snap_overhead(resolver, entities, snap_rebuilt)
+    after = snap_overhead(resolver, entities, snap_planned)
+
+    console.print(
+        "[blue]=== Snap overhead, {} entities, RPC excluded ===[/blue]".format(
+            ENTITIES
+        )
+    )
+    console.print("rebuilt calls: {:.3f} ms".format(before * 1000))
+    console.print("compiled plan: {:.3f} ms".format(after * 1000))
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from eth_abi import decode_single, encode_single
+from eth_utils import function_signature_to_4byte_selector
+
+import helpers.multicall.aggregator as aggregator
+import helpers.multicall.async_multicall as async_multicall
+from helpers.multicall import Call, CallCache, func
+from helpers.multicall.async_multicall import AsyncMulticall, get_async_web3
+from helpers.multicall.constants import MULTICALL3_ADDRESS
+
+BALANCE_OF = function_signature_to_4byte_selector("balanceOf(address)")
+FAIL = function_signature_to_4byte_selector("fail()")
+BROKEN = function_signature_to_4byte_selector("broken()")
+TRY_BLOCK_AND_AGGREGATE = function_signature_to_4byte_selector(
+    "tryBlockAndAggregate(bool,(address,bytes)[])"
+)
+LATEST = 100
+# A chain without a known aggregator
+ANVIL = 31337
+AVALANCHE = 43114
+
+
+def execute(chain_id, to, data, block):
+    """
+    What the stub chain returns: balanceOf(holder) is holder % 1000 + block +
+    chain id, fail() reverts, broken() is a node error
+    """
+    if data[:4] == BALANCE_OF:
+        (holder,) = decode_single("(address)", data[4:])
+        return encode_single("(uint256)", (int(holder, 16) % 1000 + block + chain_id,))
+    if data[:4] == FAIL:
+        raise ValueError(3, "execution reverted")
+    if data[:4] == BROKEN:
+        raise ValueError(-32000, "missing trie node")
+    raise ValueError(3, "execution reverted")
+
+
+def eth_call(chain_id, code, tx, block):
+    to, data = tx["to"].lower(), bytes.fromhex(tx["data"][2:])
+    if to == MULTICALL3_ADDRESS.lower() and to in code:
+        _, calls = decode_single("(bool,(address,bytes)[])", data[4:])
+        results = []
+        for target, calldata in calls:
+            try:
+                results.append((True, execute(chain_id, target, calldata, block)))
+            except ValueError:
+                results.append((False, b""))
+        return encode_single(
+            "(uint256,bytes32,(bool,bytes)[])", (block, b"\x00" * 32, results)
+        )
+    return execute(chain_id, to, data, block)
+
+
+def node(chain_id, code=()):
+    """
+    Local JSON-RPC stub of a chain at block 100, `code` the addresses with
+    code. Returns the server, its uri and the methods it was called with
+    """
+    code = {address.lower() for address in code}
+    methods = []
+
+    def answer(request):
+        method, params = request["method"], request["params"]
+        methods.append(method)
+        response = {"jsonrpc": "2.0", "id": request["id"]}
+        if method == "eth_chainId":
+            response["result"] = hex(chain_id)
+        elif method == "eth_blockNumber":
+            response["result"] = hex(LATEST)
+        elif method == "eth_getCode":
+            response["result"] = "0x01" if params[0].lower() in code else "0x"
+        elif method == "eth_call":
+            block = LATEST if params[1] == "latest" else int(params[1], 16)
+            try:
+                response["result"] = "0x" + eth_call(
+                    chain_id, code, params[0], block
+                ).hex()
+            except ValueError as e:
+                response["error"] = {"code": e.args[0], "message": e.args[1]}
+        return response
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            data = json.dumps(answer(body)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}".format(server.server_address[1]), methods
+
+
+@pytest.fixture
+def nodes(monkeypatch):
+    # Every test starts without resolved aggregators
+    monkeypatch.setattr(aggregator, "aggregators", {})
+    monkeypatch.setattr(async_multicall, "aggregators", aggregator.aggregators)
+    monkeypatch.setattr(async_multicall, "no_aggregator", set())
+    servers = []
+
+    def start(chain_id, code=()):
+        server, uri, methods = node(chain_id, code)
+        servers.append(server)
+        return get_async_web3(uri), methods
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+HOLDERS = ["0x" + "%040x" % holder for holder in range(1, 6)]
+TOKEN = "0x" + "ee" * 20
+
+
+def balance_calls(extra=()):
+    calls = [
+        Call(TOKEN, [func.erc20.balanceOf, holder], [[holder, None]])
+        for holder in HOLDERS
+    ]
+    return calls + [Call(TOKEN, [function], [[function, None]]) for function in extra]
+
+
+def run(*multis):
+    """
+    Runs the multicalls one after the other on one event loop, the provider
+    keeps its session per loop
+    """
+
+    async def main():
+        return [await multi() for multi in multis]
+
+    return asyncio.run(main())
+
+
+def test_plain_calls_without_an_aggregator(nodes):
+    w3, methods = nodes(ANVIL)
+
+    multi = AsyncMulticall(balance_calls(["fail()(uint256)"]), cache=None, w3=w3)
+    (result,) = run(multi)
+
+    assert multi.block == LATEST
+    assert result["fail()(uint256)"] is None
+    for index, holder in enumerate(HOLDERS):
+        assert result[holder] == index + 1 + LATEST + ANVIL
+
+
+def test_missing_aggregator_is_looked_up_once(nodes):
+    # Avalanche has known aggregator addresses, none with code on this node
+    w3, methods = nodes(AVALANCHE)
+
+    run(
+        *[
+            AsyncMulticall(balance_calls(), block_id=block, cache=None, w3=w3)
+            for block in [50, 51, 52]
+        ]
+    )
+
+    # Multicall3 and the legacy aggregate, checked for the first batch only
+    assert methods.count("eth_getCode") == 2
+    assert AVALANCHE not in aggregator.aggregators
+
+
+def test_node_errors_raise(nodes):
+    w3, _ = nodes(ANVIL)
+
+    with pytest.raises(ValueError, match="missing trie node"):
+        run(AsyncMulticall(balance_calls(["broken()(uint256)"]), cache=None, w3=w3))
+
+
+def test_multicall3_aggregate(nodes):
+    w3, methods = nodes(1, code=[MULTICALL3_ADDRESS])
+
+    multi = AsyncMulticall(
+        balance_calls(["fail()(uint256)"]), block_id=42, cache=None, w3=w3
+    )
+    (result,) = run(multi)
+
+    assert multi.block == 42
+    assert result["fail()(uint256)"] is None
+    assert [result[holder] for holder in HOLDERS] == [
+        index + 1 + 42 + 1 for index in range(len(HOLDERS))
+    ]
+    # One aggregate for every call
+    assert methods.count("eth_call") == 1
+    assert aggregator.aggregators[1].target == MULTICALL3_ADDRESS
+
+
+def test_cache_is_keyed_by_the_async_chain(nodes):
+    cache = CallCache(development=True)
+    anvil, _ = nodes(ANVIL)
+    other, _ = nodes(ANVIL + 1)
+
+    first, second, again = run(
+        AsyncMulticall(balance_calls(), block_id=7, cache=cache, w3=anvil),
+        AsyncMulticall(balance_calls(), block_id=7, cache=cache, w3=other),
+        AsyncMulticall(balance_calls(), block_id=7, cache=cache, w3=anvil),
+    )
+
+    # Same block, target and calldata, but another chain
+    assert second[HOLDERS[0]] == first[HOLDERS[0]] + 1
+    assert again == first
+    assert cache.stats()["hits"] == len(HOLDERS)
+
+
+def test_latest_reads_are_not_misses(nodes):
+    cache = CallCache(development=True)
+    w3, _ = nodes(ANVIL)
+
+    run(
+        AsyncMulticall(balance_calls(), cache=cache, w3=w3),
+        AsyncMulticall(balance_calls(), block_id=7, cache=cache, w3=w3),
+    )
+
+    stats = cache.stats()
+    assert stats["uncacheable"] == len(HOLDERS)
+    assert stats["misses"] == len(HOLDERS)
+    assert stats["hits"] == 0
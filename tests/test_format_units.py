@@ -0,0 +1,59 @@
+import pytest
+
+from helpers.SnapshotManager import SnapshotManager
+from helpers.utils import format_units, val
+
+
+@pytest.mark.parametrize(
+    "amount, decimals, places, expected",
+    [
+        (0, 18, 18, "0.000000000000000000"),
+        (1, 18, 18, "0.000000000000000001"),
+        (10 ** 18, 18, 18, "1.000000000000000000"),
+        (-(10 ** 18) - 1, 18, 18, "-1.000000000000000001"),
+        (1234567 * 10 ** 6, 6, 18, "1,234,567.000000000000000000"),
+        (1234567, 6, 6, "1.234567"),
+        (1234567, 6, 0, "1.234567"),
+        (1234567, 0, 0, "1,234,567"),
+        (-5, 0, 2, "-5.00"),
+        (42, 8, 18, "0.000000420000000000"),
+        # Exact where float division is not
+        (
+            2 ** 256 - 1,
+            18,
+            18,
+            "115,792,089,237,316,195,423,570,985,008,687,907,853,269,984,665,640,564,039,457.584007913129639935",
+        ),
+    ],
+)
+def test_format_units(amount, decimals, places, expected):
+    assert format_units(amount, decimals, places) == expected
+
+
+def test_val_uses_decimals():
+    assert val(123456, 6) == "0.123456000000000000"
+    assert val(10 ** 18) == "1.000000000000000000"
+
+
+def manager(decimals):
+    manager = SnapshotManager.__new__(SnapshotManager)
+    manager.decimals = decimals
+    return manager
+
+
+def test_format_scales_by_token_decimals():
+    snaps = manager({"want": 6, "sett": 18})
+
+    assert snaps.format("balances.want.user", 1234567) == "1.234567000000000000"
+    assert snaps.format("sett.balance", 10 ** 6) == "1.000000000000000000"
+    assert snaps.format("sett.totalSupply", 10 ** 18) == "1.000000000000000000"
+    assert snaps.format("stakingRewards.staked", 10 ** 18) == "1.000000000000000000"
+
+
+def test_format_leaves_fees_and_decimals_alone():
+    snaps = manager({"want": 6})
+
+    assert snaps.format("strategy.performanceFeeGovernance", 1000) == 1000
+    assert snaps.format("sett.min", 9500) == 9500
+    assert snaps.format("decimals.want", 6) == 6
+    assert snaps.format("sett.name", "Sett") == "Sett"
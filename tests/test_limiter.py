@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+from helpers.multicall.limiter import AdaptiveLimiter
+
+
+def test_grows_by_one_per_window_of_fast_responses():
+    limiter = AdaptiveLimiter(initial=4, target_latency=1)
+    for _ in range(4):
+        limiter.succeeded(0.1)
+    assert int(limiter.window) == 4
+    limiter.succeeded(0.1)
+    assert int(limiter.window) == 5
+
+
+def test_slow_responses_do_not_grow():
+    limiter = AdaptiveLimiter(initial=4, target_latency=1)
+    for _ in range(20):
+        limiter.succeeded(2)
+    assert limiter.window == 4
+
+
+def test_window_stays_within_bounds():
+    limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=3, target_latency=1)
+    for _ in range(100):
+        limiter.succeeded(0.1)
+    assert limiter.window == 3
+    for _ in range(10):
+        with limiter.slot():
+            limiter.throttled()
+    assert limiter.window == 1
+
+
+def test_burst_of_throttles_shrinks_once():
+    limiter = AdaptiveLimiter(initial=8)
+    tickets = []
+    with limiter.condition:
+        for _ in range(8):
+            tickets.append(limiter.take())
+    for ticket in tickets:
+        limiter.throttled(ticket)
+        limiter.release()
+
+    assert limiter.window == 4
+    assert limiter.stats()["throttles"] == 8
+
+
+def test_requests_after_a_decrease_shrink_again():
+    limiter = AdaptiveLimiter(initial=8)
+    with limiter.slot():
+        limiter.timed_out()
+    with limiter.slot():
+        limiter.timed_out()
+    assert limiter.window == 2
+    assert limiter.stats()["timeouts"] == 2
+
+
+def test_slot_caps_requests_in_flight():
+    limiter = AdaptiveLimiter(initial=2)
+    lock = threading.Lock()
+    peak = [0]
+    release = threading.Event()
+
+    def request():
+        with limiter.slot():
+            with lock:
+                peak[0] = max(peak[0], limiter.in_flight)
+            release.wait()
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    while limiter.in_flight < 2:
+        time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert limiter.in_flight == 0
+
+
+def test_async_slot_shares_the_window():
+    limiter = AdaptiveLimiter(initial=2)
+    peak = [0]
+
+    async def request():
+        async with limiter.async_slot(poll=0.001):
+            peak[0] = max(peak[0], limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*[request() for _ in range(6)])
+
+    asyncio.run(main())
+    assert peak[0] == 2
+    assert limiter.in_flight == 0
@@ -0,0 +1,47 @@
+import pytest
+from eth_abi import decode_single, encode_single
+
+from helpers.multicall.envelope import decode_aggregate, decode_try_block_and_aggregate
+
+OUTPUTS = [b"", b"\x01" * 32, b"\x02" * 33, bytes(range(200))]
+
+
+def test_decode_aggregate_matches_eth_abi():
+    output = encode_single("(uint256,bytes[])", (1234, OUTPUTS))
+    block, outputs = decode_aggregate(output)
+    expected_block, expected = decode_single("(uint256,bytes[])", output)
+
+    assert block == expected_block == 1234
+    assert [bytes(o) for o in outputs] == list(expected)
+
+
+def test_decode_aggregate_empty():
+    output = encode_single("(uint256,bytes[])", (7, []))
+    assert decode_aggregate(output) == (7, [])
+
+
+def test_single_words_are_copies():
+    output = encode_single("(uint256,bytes[])", (1, OUTPUTS))
+    _, outputs = decode_aggregate(output)
+
+    assert type(outputs[1]) is bytes
+    assert type(outputs[3]) is memoryview
+
+
+def test_decode_try_block_and_aggregate_failed_entries():
+    results = [(True, OUTPUTS[1]), (False, b"revert reason"), (True, OUTPUTS[3])]
+    output = encode_single(
+        "(uint256,bytes32,(bool,bytes)[])", (99, b"\xab" * 32, results)
+    )
+    block, outputs = decode_try_block_and_aggregate(output)
+
+    assert block == 99
+    assert outputs[1] is None
+    assert bytes(outputs[0]) == OUTPUTS[1]
+    assert bytes(outputs[2]) == OUTPUTS[3]
+
+
+def test_truncated_output_raises():
+    output = encode_single("(uint256,bytes[])", (1, [bytes(100)]))
+    with pytest.raises(ValueError):
+        decode_aggregate(output[:-40])
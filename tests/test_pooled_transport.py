@@ -0,0 +1,186 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from helpers.multicall.limiter import AdaptiveLimiter
+from helpers.multicall.transport import PooledTransport
+
+
+def answer(request):
+    return {"jsonrpc": "2.0", "id": request["id"], "result": "0x2a"}
+
+
+def node(status=200, delay=0, answer=answer, refuse_batches=None):
+    """
+    Local JSON-RPC stub, every request (or batch entry) gets answer(request),
+    by default 0x2a, batches get refuse_batches instead if given. Returns
+    the server and its uri
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(delay)
+            if isinstance(body, list) and refuse_batches:
+                response = refuse_batches
+            elif isinstance(body, list):
+                response = [answer(request) for request in body]
+            else:
+                response = answer(body)
+            data = json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}".format(server.server_address[1])
+
+
+@pytest.fixture
+def nodes():
+    servers = []
+
+    def start(**options):
+        server, uri = node(**options)
+        servers.append(server)
+        return uri
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def dead_uri():
+    server, uri = node()
+    server.server_close()
+    return uri
+
+
+TX = {"to": "0x" + "11" * 20, "data": b"\x01\x02\x03\x04"}
+
+
+def test_fails_over_on_server_error(nodes):
+    broken, good = nodes(status=503), nodes()
+    transport = PooledTransport([broken, good], limiter=AdaptiveLimiter())
+
+    assert transport.call(TX) == b"\x2a"
+
+    stats = transport.stats()
+    assert stats[broken]["failures"] == 1
+    assert not stats[broken]["healthy"]
+    assert stats[good]["failures"] == 0
+    # The broken endpoint cools down behind the one that answered
+    assert [endpoint.uri for endpoint in transport.ranked()] == [good, broken]
+
+
+def test_fails_over_on_connection_error(nodes):
+    dead, good = dead_uri(), nodes()
+    transport = PooledTransport([dead, good], limiter=AdaptiveLimiter())
+
+    assert transport.call(TX) == b"\x2a"
+    assert transport.stats()[dead]["failures"] == 1
+
+
+def test_fails_over_on_timeout(nodes):
+    slow, good = nodes(delay=1), nodes()
+    limiter = AdaptiveLimiter()
+    transport = PooledTransport([slow, good], timeout=0.2, limiter=limiter)
+
+    assert transport.call(TX) == b"\x2a"
+    assert transport.stats()[slow]["failures"] == 1
+    assert limiter.stats()["timeouts"] == 1
+
+
+def test_all_endpoints_failing_raises(nodes):
+    transport = PooledTransport(
+        [nodes(status=502), dead_uri()], limiter=AdaptiveLimiter()
+    )
+
+    with pytest.raises(requests.ConnectionError, match="All RPC endpoints failed"):
+        transport.call(TX)
+
+
+def test_client_errors_do_not_fail_over(nodes):
+    rejecting, good = nodes(status=400), nodes()
+    transport = PooledTransport([rejecting, good], limiter=AdaptiveLimiter())
+
+    with pytest.raises(requests.HTTPError):
+        transport.call(TX)
+    assert transport.stats()[good]["requests"] == 0
+
+
+def error(request, code, message):
+    return {
+        "jsonrpc": "2.0",
+        "id": request["id"],
+        "error": {"code": code, "message": message},
+    }
+
+
+def batch_node(nodes, failure):
+    """
+    Answers eth_blockNumber with 0x10, calls to 0x22.. with `failure`
+    """
+
+    def answer(request):
+        if request["method"] == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": request["id"], "result": "0x10"}
+        if request["params"][0]["to"] == "0x" + "22" * 20:
+            return failure(request)
+        return {"jsonrpc": "2.0", "id": request["id"], "result": "0x2a"}
+
+    return nodes(answer=answer)
+
+
+FAILING = {"to": "0x" + "22" * 20, "data": b"\x01\x02\x03\x04"}
+
+
+@pytest.mark.parametrize(
+    "code, message",
+    [
+        (3, "execution reverted"),
+        (-32000, "execution reverted: onlyAuthorizedActors"),
+        (-32000, "VM Exception while processing transaction: revert"),
+    ],
+)
+def test_batch_maps_reverts_to_none(nodes, code, message):
+    uri = batch_node(nodes, lambda request: error(request, code, message))
+    transport = PooledTransport([uri], limiter=AdaptiveLimiter())
+
+    block, outputs = transport.batch_call([TX, FAILING, TX])
+    assert block == 16
+    assert outputs == [b"\x2a", None, b"\x2a"]
+
+
+def test_batch_raises_on_node_errors(nodes):
+    uri = batch_node(
+        nodes, lambda request: error(request, -32000, "missing trie node abc")
+    )
+    transport = PooledTransport([uri], limiter=AdaptiveLimiter())
+
+    with pytest.raises(ValueError, match="missing trie node"):
+        transport.batch_call([TX, FAILING], block_id=5)
+
+
+def test_refused_batch_raises(nodes):
+    uri = nodes(
+        refuse_batches={
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {"code": -32600, "message": "batch too large"},
+        }
+    )
+    transport = PooledTransport([uri], limiter=AdaptiveLimiter())
+
+    with pytest.raises(ValueError, match="batch too large"):
+        transport.batch_call([TX, TX], block_id=5)
@@ -0,0 +1,144 @@
+import sqlite3
+
+import pytest
+
+from helpers.snapshot.archive import SnapArchive, decode_value, encode_value
+from helpers.snapshot.snap import Snap
+
+MAX_UINT256 = 2 ** 256 - 1
+
+EDGES = [
+    0,
+    1,
+    -1,
+    2 ** 63 - 1,
+    2 ** 63,
+    -(2 ** 63),
+    -(2 ** 63) - 1,
+    2 ** 128,
+    MAX_UINT256,
+    -MAX_UINT256,
+]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = SnapArchive(str(tmp_path / "snaps.db"))
+    yield archive
+    archive.close()
+
+
+@pytest.mark.parametrize("value", EDGES)
+def test_value_round_trip(value):
+    assert decode_value(encode_value(value)) == value
+
+
+def test_int64_values_stay_integers():
+    assert encode_value(2 ** 63 - 1) == 2 ** 63 - 1
+    assert type(encode_value(2 ** 63)) is bytes
+
+
+def test_snap_round_trip(archive):
+    data = {"value{}".format(i): value for i, value in enumerate(EDGES)}
+    data["sett.name"] = "Sett"
+    data["strategy.paused"] = None
+    snap = Snap(data, 42, ["user", "sett"])
+    snap.seq = 7
+
+    seq = archive.write(snap)
+    loaded = archive.snap(seq)
+
+    assert dict(loaded.data) == data
+    assert loaded.block == 42
+    assert loaded.entityKeys == ["user", "sett"]
+    assert len(archive) == 1
+
+
+def test_column_across_snaps(archive):
+    for block in range(5):
+        snap = Snap({"balances.want.user": MAX_UINT256 - block}, 100 + block, [])
+        snap.seq = block
+        archive.write(snap)
+
+    seqs, blocks, values = archive.column("balances.want.user")
+    assert list(blocks) == [100, 101, 102, 103, 104]
+    assert list(values) == [MAX_UINT256 - block for block in range(5)]
+
+    _, blocks, values = archive.column("balances.want.user", start=101, end=102)
+    assert list(blocks) == [101, 102]
+    assert list(values) == [MAX_UINT256 - 1, MAX_UINT256 - 2]
+
+
+def test_reopened_archive_is_a_new_run(tmp_path):
+    path = str(tmp_path / "snaps.db")
+    archive = SnapArchive(path)
+    snap = Snap({"sett.totalSupply": MAX_UINT256}, 1, [])
+    snap.seq = 0
+    archive.write(snap)
+    archive.close()
+
+    archive = SnapArchive(path)
+    assert archive.run == 2
+    assert archive.keys("sett.") == ["sett.totalSupply"]
+    assert archive.snap(1).data["sett.totalSupply"] == MAX_UINT256
+    archive.close()
+
+
+def test_unknown_snap_raises(archive):
+    with pytest.raises(KeyError):
+        archive.snap(1)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        b"\x12" * 32,
+        b"",
+        True,
+        False,
+        None,
+        "Sett",
+        1.5,
+        ("0x" + "11" * 20, "0x" + "22" * 20),
+        (),
+        ((1, MAX_UINT256), (b"\x01", True, None)),
+    ],
+)
+def test_values_keep_their_type(value):
+    decoded = decode_value(encode_value(value))
+    assert decoded == value
+    assert type(decoded) is type(value)
+
+
+def test_lists_come_back_as_tuples():
+    assert decode_value(encode_value([1, [2, 3]])) == (1, (2, 3))
+
+
+def test_unsupported_values_are_rejected(archive):
+    snap = Snap({"strategy.protected": ("0x" + "11" * 20,)}, 1, [])
+    snap.seq = 0
+    archive.write(snap)
+
+    bad = Snap({"sett.new": 1, "sett.object": object()}, 2, [])
+    bad.seq = 1
+    with pytest.raises(TypeError):
+        archive.write(bad)
+
+    assert len(archive) == 1
+    assert archive.keys("sett.") == []
+    assert archive.snap(1).data["strategy.protected"] == ("0x" + "11" * 20,)
+
+
+def test_keys_of_a_rolled_back_write_are_forgotten(archive):
+    # The vals insert fails after the new key went in
+    archive.db.execute(
+        "CREATE TRIGGER fail BEFORE INSERT ON vals"
+        " BEGIN SELECT RAISE(ABORT, 'full'); END"
+    )
+    snap = Snap({"sett.new": 2}, 2, [])
+    snap.seq = 0
+
+    with pytest.raises(sqlite3.IntegrityError):
+        archive.write(snap)
+    assert archive.keys() == []
+    assert archive.db.execute("SELECT COUNT(*) FROM keys").fetchone()[0] == 0
@@ -0,0 +1,119 @@
+import pytest
+
+from helpers.snapshot import lazy
+from helpers.snapshot.history import SnapHistory
+from helpers.snapshot.lazy import LazySnap
+from helpers.snapshot.snap import Snap
+
+
+def snap(block, value=None):
+    value = block if value is None else value
+    return Snap(
+        {"sett.totalSupply": value * 10 ** 18, "balances.want.user": value},
+        block,
+        ["user"],
+    )
+
+
+def test_spills_beyond_the_window():
+    history = SnapHistory(window=3)
+    for block in range(10):
+        history.add(snap(block))
+
+    stats = history.stats()
+    assert stats["snaps"] == 10
+    assert stats["in_memory"] == 3
+    assert stats["spilled"] == 7
+    assert stats["file_bytes"] > 0
+    history.close()
+
+
+def test_spilled_snaps_load_back():
+    history = SnapHistory(window=2)
+    seqs = [history.add(snap(block)) for block in range(6)]
+
+    for seq, block in zip(seqs, range(6)):
+        loaded = history[seq]
+        assert loaded.seq == seq
+        assert loaded.block == block
+        assert loaded.entityKeys == ["user"]
+        assert dict(loaded.data) == dict(snap(block).data)
+    history.close()
+
+
+def test_spills_beyond_max_bytes():
+    history = SnapHistory(window=100, max_bytes=1)
+    for block in range(5):
+        history.add(snap(block))
+
+    # The latest snap always stays in memory
+    assert history.stats()["in_memory"] == 1
+    assert history.latest().block == 4
+    assert history[0].block == 0
+    history.close()
+
+
+def test_snaps_by_block():
+    history = SnapHistory(window=1)
+    history.add(snap(1, 10))
+    history.add(snap(2, 20))
+    history.add(snap(2, 21))
+
+    assert [s.data["balances.want.user"] for s in history.at(2)] == [20, 21]
+    assert history.latest(1).data["balances.want.user"] == 10
+    assert history.at(3) == []
+    with pytest.raises(KeyError):
+        history.latest(3)
+    history.close()
+
+
+def test_unknown_seq_raises():
+    history = SnapHistory()
+    history.add(snap(1))
+
+    assert 0 in history
+    assert 1 not in history
+    with pytest.raises(KeyError):
+        history[1]
+    history.close()
+
+
+def test_history_file_at_path(tmp_path):
+    path = tmp_path / "snaps.bin"
+    history = SnapHistory(window=1, path=str(path))
+    history.add(snap(1))
+    history.add(snap(2))
+
+    assert history[0].block == 1
+    history.close()
+    assert path.stat().st_size > 0
+
+
+def test_spilled_lazy_snaps_stay_lazy(monkeypatch):
+    fetched = []
+
+    class Multicall:
+        def __init__(self, calls, block_id=None, label=None):
+            self.calls = calls
+            self.block_id = block_id
+
+        def __call__(self):
+            fetched.append((self.calls, self.block_id))
+            return {"sett.balance": self.block_id * 10}
+
+    monkeypatch.setattr(lazy, "Multicall", Multicall)
+    used = {"balances.want.user"}
+    calls = {"balances.want.user": "balanceCall", "sett.balance": "settCall"}
+    history = SnapHistory(window=1)
+    for block in [1, 2]:
+        history.add(
+            LazySnap({"balances.want.user": block}, block, ["user"], calls, used, "k")
+        )
+
+    loaded = history[0]
+    assert isinstance(loaded, LazySnap)
+    assert loaded.get("balances.want.user") == 1
+    assert loaded.get("sett.balance") == 10
+    assert fetched == [(["settCall"], 1)]
+    assert "sett.balance" in used
+    history.close()